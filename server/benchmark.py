@@ -0,0 +1,440 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:  # Only the benchmark needs an HTTP client
+    httpx = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Allow running as `python server/benchmark.py` from the project root
+sys.path.insert(0, str(PROJECT_ROOT))
+
+PHASES = ("upload", "list", "download", "delete")
+DEFAULT_SIZES = "64KB:6,1MB:3,8MB:1"  # size:weight pairs for uploaded files
+LIST_PAGE_SIZE = 50
+REQUEST_TIMEOUT_SECONDS = 120.0
+JOBS_POLL_INTERVAL_SECONDS = 0.1
+JOBS_SETTLE_TIMEOUT_SECONDS = 600.0
+# Rate limits are raised for in-process runs so they measure the handlers,
+# not the limiter; a real server needs the same environment to match
+BENCHMARK_ENV = {"RATE_LIMIT_PER_SECOND": "1000000", "RATE_LIMIT_BURST": "1000000"}
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024, "B": 1}
+PADDING_LINE_LENGTH = 1024
+HIGH_BYTES = bytes(value | 0x80 for value in range(256))  # translate() table
+
+def parse_size(text: str) -> int:
+    """``64KB``, ``1MB`` or a plain byte count"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def parse_size_mix(text: str) -> List[Tuple[int, int]]:
+    """``64KB:6,1MB:3`` into (size, weight) pairs"""
+    mix = []
+    for part in text.split(","):
+        size, _, weight = part.partition(":")
+        mix.append((parse_size(size), int(weight or 1)))
+    return mix
+
+def file_sizes(mix: List[Tuple[int, int]], count: int) -> List[int]:
+    """``count`` sizes interleaved in proportion to their weights"""
+    cycle = [size for size, weight in mix for _ in range(weight)]
+    return [cycle[index % len(cycle)] for index in range(count)]
+
+def make_pdf(size: int, seed: int) -> bytes:
+    """A one-page PDF padded to about ``size`` bytes.
+
+    Padding is seeded random bytes in comment lines, so every upload is
+    distinct content rather than a deduplicated copy. The bytes are kept
+    above 0x7F: like compressed streams in real PDFs they hold no PDF
+    tokens, and they let the multipart parser skip ahead as it does on
+    real uploads (ASCII padding makes it crawl byte by byte).
+    """
+    header = b"%PDF-1.4\n"
+    content = b"BT /F1 12 Tf 72 720 Td (Benchmark document %d) Tj ET" % seed
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    # Each line adds a "%" and a newline to its noise
+    noise_size = max(0, size - 600) * PADDING_LINE_LENGTH // (PADDING_LINE_LENGTH + 2)
+    noise = random.Random(seed).randbytes(noise_size).translate(HIGH_BYTES)
+    padding = b"".join(
+        b"%" + noise[offset:offset + PADDING_LINE_LENGTH] + b"\n"
+        for offset in range(0, len(noise), PADDING_LINE_LENGTH)
+    )
+    body = bytearray(header + padding)
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+    xref_offset = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        body += b"%010d 00000 n \n" % offset
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+    return bytes(body)
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = math.ceil(fraction * len(sorted_values)) - 1
+    return sorted_values[max(0, index)]
+
+class PhaseResult:
+    """Latencies and outcomes of one benchmark phase"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def record(self, latency: float, status: int, size: int = 0):
+        self.latencies.append(latency)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if 200 <= status < 300:
+            self.bytes += size
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        errors = sum(n for status, n in self.statuses.items() if not status.startswith("2"))
+        return {
+            "requests": count,
+            "errors": errors,
+            "statuses": self.statuses,
+            "elapsed_seconds": round(self.elapsed, 4),
+            "throughput_rps": round(count / self.elapsed, 2) if self.elapsed else 0.0,
+            "throughput_mb_s": round(self.bytes / self.elapsed / 1024 / 1024, 2) if self.elapsed else 0.0,
+            "latency_ms": {
+                "mean": round(sum(ordered) / count * 1000, 3) if count else 0.0,
+                "p50": round(percentile(ordered, 0.50) * 1000, 3),
+                "p95": round(percentile(ordered, 0.95) * 1000, 3),
+                "p99": round(percentile(ordered, 0.99) * 1000, 3),
+                "max": round(ordered[-1] * 1000, 3) if count else 0.0
+            }
+        }
+
+async def run_phase(
+    name: str,
+    tasks: List[Callable[[], Awaitable[Tuple[int, int]]]],
+    concurrency: int
+) -> PhaseResult:
+    """Run ``tasks`` with ``concurrency`` in flight, timing each one.
+
+    Calling a task prepares its request; awaiting the result sends it
+    and is what gets timed. Each returns (status code, payload bytes moved).
+    """
+    result = PhaseResult(name)
+    pending = iter(tasks)
+
+    async def worker():
+        for task in pending:
+            request = task()
+            started = time.perf_counter()
+            try:
+                status, size = await request
+            except httpx.HTTPError:
+                status, size = 0, 0
+            result.record(time.perf_counter() - started, status, size)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+async def wait_for_jobs(client: "httpx.AsyncClient") -> Optional[float]:
+    """Wait for the background jobs a phase queued; returns how long that took.
+
+    Keeps post-upload work (text indexing, previews) from
+    overlapping the next phase. None if the queue did not drain in time.
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < JOBS_SETTLE_TIMEOUT_SECONDS:
+        stats = (await client.get("/api/jobs/stats")).json()
+        if stats["queued"] == 0 and stats["running"] == 0:
+            return time.perf_counter() - started
+        await asyncio.sleep(JOBS_POLL_INTERVAL_SECONDS)
+    return None
+
+def read_rss(pid: Optional[int] = None) -> Optional[dict]:
+    """Current and peak resident set size in MB, from /proc where available"""
+    status_path = Path(f"/proc/{pid or 'self'}/status")
+    try:
+        fields = dict(
+            line.split(":", 1) for line in status_path.read_text().splitlines() if ":" in line
+        )
+    except OSError:
+        if pid is not None:
+            return None
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return {"current_mb": None, "peak_mb": round(peak / scale, 1)}
+    to_mb = lambda value: round(int(value.split()[0]) / 1024, 1)
+    return {"current_mb": to_mb(fields["VmRSS"]), "peak_mb": to_mb(fields["VmHWM"])}
+
+async def run_workload(client: "httpx.AsyncClient", args, rss_pid: Optional[int]) -> dict:
+    """Upload, list, download and delete ``args.documents`` documents"""
+    sizes = file_sizes(parse_size_mix(args.sizes), args.documents)
+    ids: List[int] = []
+    results = {}
+    rss = {"start": read_rss(rss_pid)}
+
+    def upload(index: int, size: int):
+        def task():
+            # Generated before the clock starts
+            body = make_pdf(size, args.seed + index)
+
+            async def send():
+                response = await client.post(
+                    "/api/documents/upload",
+                    files={"document": (f"bench-{index}.pdf", body, "application/pdf")}
+                )
+                if response.status_code == 200:
+                    ids.append(response.json()["document"]["id"])
+                return response.status_code, len(body)
+            return send()
+        return task
+
+    def list_page():
+        async def task():
+            response = await client.get("/api/documents", params={"limit": LIST_PAGE_SIZE})
+            return response.status_code, len(response.content)
+        return task
+
+    def download(document_id: int):
+        async def task():
+            response = await client.get(f"/api/documents/{document_id}")
+            return response.status_code, len(response.content)
+        return task
+
+    def delete(document_id: int):
+        async def task():
+            response = await client.delete(f"/api/documents/{document_id}")
+            return response.status_code, 0
+        return task
+
+    for phase in args.phases:
+        if phase == "upload":
+            tasks = [upload(index, size) for index, size in enumerate(sizes)]
+        elif phase == "list":
+            tasks = [list_page() for _ in range(args.list_requests or args.documents)]
+        elif phase == "download":
+            tasks = [download(document_id) for document_id in ids]
+        else:
+            tasks = [delete(document_id) for document_id in ids]
+        results[phase] = (await run_phase(phase, tasks, args.concurrency)).summary()
+        rss[phase] = read_rss(rss_pid)
+        print(format_phase(phase, results[phase]))
+        if args.settle:
+            drained = await wait_for_jobs(client)
+            results[phase]["jobs_drain_seconds"] = None if drained is None else round(drained, 4)
+
+    if "delete" not in args.phases and ids and args.cleanup:
+        for document_id in ids:
+            await client.delete(f"/api/documents/{document_id}")
+
+    return {"phases": results, "rss": rss}
+
+async def run_in_process(args) -> dict:
+    """Drive the app through httpx's ASGI transport, in a scratch directory.
+
+    The database and uploads are created under ``args.workdir``, or a
+    temporary directory removed afterwards, so runs start from the same
+    state and never touch real data. Startup and shutdown handlers run as they
+    would under uvicorn.
+    """
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="medical-docs-bench-"))
+    (workdir / "server").mkdir(parents=True, exist_ok=True)
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+    # Paths in server.main are relative to the working directory
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from server.main import app
+
+        await app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=REQUEST_TIMEOUT_SECONDS
+            ) as client:
+                return await run_workload(client, args, None)
+        finally:
+            await app.router.shutdown()
+    finally:
+        os.chdir(previous_cwd)
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+async def run_over_http(args) -> dict:
+    """Drive a running server over real sockets.
+
+    Start it with the BENCHMARK_ENV rate limits to compare against
+    in-process runs. Pass ``--server-pid`` to record the server's RSS.
+    """
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=REQUEST_TIMEOUT_SECONDS, limits=limits
+    ) as client:
+        return await run_workload(client, args, args.server_pid)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def format_phase(name: str, summary: dict) -> str:
+    latency = summary["latency_ms"]
+    return (
+        f"{name:<9} {summary['requests']:>6} req  {summary['throughput_rps']:>9.1f} req/s  "
+        f"p50 {latency['p50']:>8.2f}ms  p95 {latency['p95']:>8.2f}ms  "
+        f"p99 {latency['p99']:>8.2f}ms  errors {summary['errors']}"
+    )
+
+def compare_reports(baseline: dict, report: dict, max_regression: float) -> List[str]:
+    """Print per-phase changes against ``baseline``; returns regressions
+    worse than ``max_regression`` percent in p95 latency or throughput
+    """
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for phase, summary in report["phases"].items():
+        before = baseline["phases"].get(phase)
+        if before is None:
+            continue
+        changes = {}
+        for label, old, new, higher_is_better in (
+            ("p50", before["latency_ms"]["p50"], summary["latency_ms"]["p50"], False),
+            ("p95", before["latency_ms"]["p95"], summary["latency_ms"]["p95"], False),
+            ("p99", before["latency_ms"]["p99"], summary["latency_ms"]["p99"], False),
+            ("req/s", before["throughput_rps"], summary["throughput_rps"], True),
+        ):
+            change = (new - old) / old * 100 if old else 0.0
+            changes[label] = change
+            worse = -change if higher_is_better else change
+            if label in ("p95", "req/s") and worse > max_regression:
+                regressions.append(f"{phase} {label} {change:+.1f}%")
+        print(f"{phase:<9} " + "  ".join(f"{label} {change:+6.1f}%" for label, change in changes.items()))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the documents API and record latency, throughput and RSS"
+    )
+    parser.add_argument(
+        "--url",
+        help="Benchmark a running server over HTTP (e.g. http://localhost:3001) "
+             "instead of the app in-process"
+    )
+    parser.add_argument("--server-pid", type=int, help="Server process to sample RSS from with --url")
+    parser.add_argument("--documents", type=int, default=200, help="Documents uploaded (default 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight (default 8)")
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help=f"File size mix as size:weight pairs (default {DEFAULT_SIZES})"
+    )
+    parser.add_argument(
+        "--phases",
+        default=",".join(PHASES),
+        help="Comma-separated phases to run, in order (default all)"
+    )
+    parser.add_argument("--list-requests", type=int, help="Listing requests (default --documents)")
+    parser.add_argument("--seed", type=int, default=0, help="Varies generated file contents")
+    parser.add_argument("--workdir", help="Scratch directory for in-process runs (default a new temp dir)")
+    parser.add_argument(
+        "--no-cleanup",
+        dest="cleanup",
+        action="store_false",
+        help="Keep uploaded documents when the delete phase is skipped"
+    )
+    parser.add_argument(
+        "--no-settle",
+        dest="settle",
+        action="store_false",
+        help="Start each phase without waiting for background jobs to finish"
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=10.0,
+        help="Exit non-zero if p95 latency or throughput is this many percent worse "
+             "than --compare (default 10)"
+    )
+    args = parser.parse_args()
+    args.phases = [phase.strip() for phase in args.phases.split(",") if phase.strip()]
+    unknown = set(args.phases) - set(PHASES)
+    if unknown:
+        parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+    if httpx is None:
+        print("❌ The benchmark requires httpx: pip install httpx")
+        sys.exit(1)
+
+    config = {
+        key: getattr(args, key)
+        for key in ("documents", "concurrency", "sizes", "phases", "list_requests", "seed", "settle")
+    }
+    meta = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "mode": "http" if args.url else "asgi",
+        "url": args.url,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config
+    }
+    print(f"🏁 Benchmarking {meta['mode']} at commit {meta['commit'] or 'unknown'}")
+    report = asyncio.run(run_over_http(args) if args.url else run_in_process(args))
+    report = {"meta": meta, **report}
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"📄 Results written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline["meta"].get("config") != config:
+            print("⚠️  Baseline was recorded with a different configuration")
+        regressions = compare_reports(baseline, report, args.max_regression)
+        if regressions:
+            print(f"❌ Regressions over {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, AsyncContextManager, Callable, List, NamedTuple, Optional, Tuple
+
+import aiosqlite
+
+# RETURNING needs SQLite 3.35; older libraries get rows built from the
+# values that were bound, or selected before deleting
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+DOCUMENT_COLUMNS = "id, filename, original_name, filepath, filesize, created_at, content_hash"
+
+# Ids are bound as one JSON array, so every batch size shares one
+# statement text and one cached prepared statement
+IDS_CLAUSE = "id IN (SELECT value FROM json_each(?))"
+
+class DocumentRecord:
+    """One row of the ``documents`` table"""
+
+    __slots__ = (
+        "id", "filename", "original_name", "filepath", "filesize", "created_at", "content_hash"
+    )
+
+    def __init__(
+        self,
+        id: int,
+        filename: str,
+        original_name: str,
+        filepath: str,
+        filesize: int,
+        created_at: str,
+        content_hash: Optional[str]
+    ):
+        self.id = id
+        self.filename = filename
+        self.original_name = original_name
+        self.filepath = filepath
+        self.filesize = filesize
+        self.created_at = created_at
+        self.content_hash = content_hash
+
+    @classmethod
+    def from_row(cls, row) -> "DocumentRecord":
+        """Build from a row selected as DOCUMENT_COLUMNS, in that order"""
+        return cls(*row)
+
+class DocumentSummary(NamedTuple):
+    """The listing columns of a document"""
+
+    id: int
+    filename: str
+    filesize: int
+    created_at: str
+
+class SearchHit(NamedTuple):
+    """A document matching a full-text search"""
+
+    id: int
+    filename: str
+    filesize: int
+    created_at: str
+    snippet: str
+    score: float  # bm25, negative; lower is a better match
+
+class DocumentFilters:
+    """Listing filters, each answered by an index range scan"""
+
+    __slots__ = ("name_prefix", "min_size", "max_size", "created_after", "created_before")
+
+    def __init__(
+        self,
+        name_prefix: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None
+    ):
+        self.name_prefix = name_prefix
+        self.min_size = min_size
+        self.max_size = max_size
+        self.created_after = created_after
+        self.created_before = created_before
+
+    def clauses(self) -> Tuple[List[str], List[Any]]:
+        """WHERE clauses and their parameters, written as ranges over
+        indexed columns so SQLite can use an index range scan
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+
+        if self.name_prefix:
+            # NOCASE range equivalent of a case-insensitive prefix match
+            clauses.append(
+                "original_name >= ? COLLATE NOCASE AND original_name < ? COLLATE NOCASE"
+            )
+            params.extend([self.name_prefix, self.name_prefix + "\U0010ffff"])
+        if self.min_size is not None:
+            clauses.append("filesize >= ?")
+            params.append(self.min_size)
+        if self.max_size is not None:
+            clauses.append("filesize <= ?")
+            params.append(self.max_size)
+        if self.created_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(self.created_after.isoformat())
+        if self.created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(self.created_before.isoformat())
+
+        return clauses, params
+
+class DocumentRepository:
+    """Every query against ``documents`` and its full-text index.
+
+    Reads check out one of the pool's long-lived reader connections, whose
+    prepared statements stay cached between requests; statement texts are
+    kept to a fixed set so they do. Methods that write take the connection
+    of the write op they run in, so they commit (or roll back) with the
+    rest of that op. Rows come back as DocumentRecord or tuple records.
+    """
+
+    def __init__(self, reader: Callable[[], AsyncContextManager[aiosqlite.Connection]]):
+        self.reader = reader
+
+    async def get(self, document_id: int) -> Optional[DocumentRecord]:
+        async with self.reader() as conn:
+            cursor = await conn.execute(
+                f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE id = ?",
+                (document_id,)
+            )
+            row = await cursor.fetchone()
+        return None if row is None else DocumentRecord.from_row(row)
+
+    async def get_many(self, ids: List[int]) -> List[DocumentRecord]:
+        """The documents among ``ids`` that exist, in no particular order"""
+        async with self.reader() as conn:
+            cursor = await conn.execute(
+                f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE {IDS_CLAUSE}",
+                (json.dumps(ids),)
+            )
+            rows = await cursor.fetchall()
+        return [DocumentRecord.from_row(row) for row in rows]
+
+    async def list_page(
+        self,
+        filters: DocumentFilters,
+        after: Optional[Tuple[str, int]],
+        limit: int
+    ) -> List[DocumentSummary]:
+        """Up to ``limit`` documents newest first, from just after ``after``,
+        a (created_at, id) position (keyset pagination)
+        """
+        clauses, params = filters.clauses()
+        if after is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        query = "SELECT id, original_name, filesize, created_at FROM documents"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        async with self.reader() as conn:
+            cursor = await conn.execute(query, params)
+            rows = await cursor.fetchall()
+        return [DocumentSummary(*row) for row in rows]
+
+    async def search(
+        self,
+        match: str,
+        highlight: Tuple[str, str],
+        snippet_tokens: int,
+        name_weight: float,
+        limit: int,
+        offset: int
+    ) -> List[SearchHit]:
+        """Documents matching the FTS5 query ``match``, best first"""
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT d.id, d.original_name, d.filesize, d.created_at,
+                       snippet(documents_fts, 1, ?, ?, '…', ?),
+                       bm25(documents_fts, ?, 1.0) AS score
+                FROM documents_fts
+                JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, (*highlight, snippet_tokens, name_weight, match, limit, offset))
+            rows = await cursor.fetchall()
+        return [SearchHit(*row) for row in rows]
+
+    async def insert(
+        self,
+        conn: aiosqlite.Connection,
+        filename: str,
+        original_name: str,
+        filepath: str,
+        filesize: int,
+        created_at: str,
+        content_hash: Optional[str]
+    ) -> DocumentRecord:
+        """Insert a document and return it, in a single statement"""
+        values = (filename, original_name, filepath, filesize, created_at, content_hash)
+        if SQLITE_HAS_RETURNING:
+            cursor = await conn.execute(f"""
+                INSERT INTO documents (filename, original_name, filepath, filesize, created_at, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING {DOCUMENT_COLUMNS}
+            """, values)
+            row = await cursor.fetchone()
+            await cursor.close()
+            return DocumentRecord.from_row(row)
+
+        cursor = await conn.execute("""
+            INSERT INTO documents (filename, original_name, filepath, filesize, created_at, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, values)
+        return DocumentRecord(cursor.lastrowid, *values)
+
+    async def delete(self, conn: aiosqlite.Connection, document_id: int) -> Optional[DocumentRecord]:
+        """Delete a document, returning the row it had, or None if absent"""
+        deleted = await self.delete_many(conn, [document_id])
+        return deleted[0] if deleted else None
+
+    async def delete_many(self, conn: aiosqlite.Connection, ids: List[int]) -> List[DocumentRecord]:
+        """Delete the documents among ``ids`` that exist and return their rows"""
+        params = (json.dumps(ids),)
+        if SQLITE_HAS_RETURNING:
+            cursor = await conn.execute(
+                f"DELETE FROM documents WHERE {IDS_CLAUSE} RETURNING {DOCUMENT_COLUMNS}",
+                params
+            )
+        else:
+            cursor = await conn.execute(
+                f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE {IDS_CLAUSE}",
+                params
+            )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        if not SQLITE_HAS_RETURNING:
+            await conn.execute(f"DELETE FROM documents WHERE {IDS_CLAUSE}", params)
+        return [DocumentRecord.from_row(row) for row in rows]
+
+    async def copy_indexed_text(self, conn: aiosqlite.Connection, document_id: int) -> bool:
+        """Index a document with the text of an indexed document sharing its
+        content; False if there is none
+        """
+        await conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+        cursor = await conn.execute("""
+            INSERT INTO documents_fts (rowid, original_name, body)
+            SELECT d.id, d.original_name, f.body
+            FROM documents d
+            JOIN documents other ON other.content_hash = d.content_hash AND other.id != d.id
+            JOIN documents_fts f ON f.rowid = other.id
+            WHERE d.id = ?
+            LIMIT 1
+        """, (document_id,))
+        return cursor.rowcount > 0
+
+    async def index_text(self, conn: aiosqlite.Connection, document_id: int, text: str):
+        """Set a document's indexed text; a no-op for deleted documents"""
+        await conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+        await conn.execute("""
+            INSERT INTO documents_fts (rowid, original_name, body)
+            SELECT id, original_name, ? FROM documents WHERE id = ?
+        """, (text, document_id))
@@ -0,0 +1,291 @@
+import asyncio
+import functools
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Set
+
+import aiosqlite
+
+if TYPE_CHECKING:
+    from server.main import DatabasePool
+
+JOB_WORKERS = 4  # Jobs run concurrently in the API process
+JOB_MAX_ATTEMPTS = 3  # Runs before a job is left in the failed state
+JOB_RETRY_BASE_SECONDS = 5.0  # First retry delay; doubles on each attempt
+JOB_POLL_INTERVAL_SECONDS = 1.0  # How often due retries are looked for
+JOB_WRITE_RETRY_BASE_SECONDS = 0.5  # First wait after a failed job state write
+JOB_WRITE_RETRY_MAX_SECONDS = 30.0  # Cap on that wait as it doubles
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after REAL NOT NULL,
+        last_error TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+JOBS_INDEX_DDL = """
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after
+    ON jobs (status, run_after)
+"""
+
+async def enqueue_job(conn: aiosqlite.Connection, kind: str, payload: dict) -> int:
+    """Record a queued job inside a write op and return its id.
+
+    Enqueuing in the same write op as the change the job follows up on
+    means the job exists exactly when that change commits. Call
+    ``JobQueue.wake()`` after the write returns.
+    """
+    now = datetime.now().isoformat()
+    cursor = await conn.execute("""
+        INSERT INTO jobs (kind, payload, run_after, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (kind, json.dumps(payload), time.time(), now, now))
+    return cursor.lastrowid
+
+class JobHandler:
+    """A registered job kind"""
+
+    __slots__ = ("func", "in_process_pool", "max_attempts", "on_failure")
+
+    def __init__(
+        self,
+        func: Callable[[dict], Any],
+        in_process_pool: bool,
+        max_attempts: int,
+        on_failure: Optional[Callable[[dict], Awaitable[None]]]
+    ):
+        self.func = func
+        self.in_process_pool = in_process_pool
+        self.max_attempts = max_attempts
+        self.on_failure = on_failure
+
+class JobQueue:
+    """Background jobs persisted in the ``jobs`` table.
+
+    Job state lives in SQLite, so queued work survives restarts; jobs
+    that were running when the process stopped are queued again on
+    ``start()``. A dispatcher task claims due jobs only while fewer than
+    ``workers`` are running, so a burst of uploads grows the durable
+    backlog instead of memory or concurrency. Failed jobs are retried
+    with exponential backoff and stay in the table once they run out of
+    attempts; finished jobs are deleted. Writes of job state (claims,
+    outcomes) that fail, for instance because another process holds the
+    write lock past the busy timeout, are retried with backoff.
+
+    Handlers are async functions taking the job payload, or, with
+    ``in_process_pool=True``, plain functions run in a process pool of
+    ``process_workers`` (or on a thread when that is 0). Async handlers
+    can offload single steps there with ``run_in_pool()``. Functions run
+    in the pool must be importable module-level functions that do not
+    depend on server.main. ``on_failure`` is awaited with the payload of
+    a job that ran out of attempts.
+    """
+
+    def __init__(self, db: "DatabasePool", workers: int, process_workers: int = 0):
+        self.db = db
+        self.workers = workers
+        self.process_workers = process_workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(
+        self,
+        kind: str,
+        func: Callable[[dict], Any],
+        in_process_pool: bool = False,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        on_failure: Optional[Callable[[dict], Awaitable[None]]] = None
+    ):
+        self._handlers[kind] = JobHandler(func, in_process_pool, max_attempts, on_failure)
+
+    async def start(self):
+        """Requeue interrupted jobs and start dispatching"""
+        async def requeue_interrupted(conn: aiosqlite.Connection):
+            await conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (datetime.now().isoformat(),)
+            )
+
+        await self.db.write(requeue_interrupted)
+        if self.process_workers:
+            # Forking would copy the event loop and aiosqlite threads
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        """Stop dispatching and cancel running jobs.
+
+        Cancelled jobs stay in the running state and are requeued by the
+        next ``start()``.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    async def run_in_pool(self, func: Callable[..., Any], *args) -> Any:
+        """Run a CPU-heavy step of an async handler in the process pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._process_pool, functools.partial(func, *args)
+        )
+
+    def wake(self):
+        """Tell the dispatcher new jobs may be due"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _dispatch(self):
+        while True:
+            self._wake.clear()
+            free = self.workers - len(self._running)
+            if free > 0:
+                jobs = await self._write_state(functools.partial(self._claim, limit=free))
+                for job in jobs:
+                    task = asyncio.create_task(self._run(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._finished)
+                if len(jobs) == free:
+                    # There may be more due jobs; wait for a free worker
+                    await self._wake.wait()
+                    continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        self.wake()
+
+    async def _write_state(self, op: Callable[[aiosqlite.Connection], Any]) -> Any:
+        """Run a job state write op, retrying until it commits.
+
+        A failed write rolls back whole, so retrying it is safe; giving up
+        would stop the dispatcher or leave a job running until restart.
+        """
+        delay = JOB_WRITE_RETRY_BASE_SECONDS
+        while True:
+            try:
+                return await self.db.write(op)
+            except Exception as e:
+                print(f"Job queue write failed, retrying in {delay:g}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, JOB_WRITE_RETRY_MAX_SECONDS)
+
+    async def _claim(self, conn: aiosqlite.Connection, limit: int) -> list:
+        cursor = await conn.execute("""
+            SELECT id, kind, payload, attempts FROM jobs
+            WHERE status = 'queued' AND run_after <= ?
+            ORDER BY run_after, id
+            LIMIT ?
+        """, (time.time(), limit))
+        jobs = await cursor.fetchall()
+        if jobs:
+            ids = [job["id"] for job in jobs]
+            await conn.execute(
+                f"UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                f"WHERE id IN ({', '.join('?' * len(ids))})",
+                (datetime.now().isoformat(), *ids)
+            )
+        return jobs
+
+    async def _run(self, job):
+        handler = self._handlers.get(job["kind"])
+        attempts = job["attempts"] + 1
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {job['kind']!r}")
+            payload = json.loads(job["payload"])
+            if handler.in_process_pool:
+                await self.run_in_pool(handler.func, payload)
+            else:
+                await handler.func(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry = handler is not None and attempts < handler.max_attempts
+            print(f"Job {job['id']} ({job['kind']}) attempt {attempts} failed: {e}")
+            await self._write_state(functools.partial(
+                self._record_failure,
+                job_id=job["id"], attempts=attempts, error=repr(e), retry=retry
+            ))
+            if retry:
+                self.retried += 1
+                return
+            self.failed += 1
+            if handler is not None and handler.on_failure is not None:
+                try:
+                    await handler.on_failure(json.loads(job["payload"]))
+                except Exception as e:
+                    print(f"Job {job['id']} ({job['kind']}) failure handler failed: {e}")
+            return
+
+        await self._write_state(functools.partial(self._record_success, job_id=job["id"]))
+        self.completed += 1
+
+    async def _record_success(self, conn: aiosqlite.Connection, job_id: int):
+        await conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def _record_failure(
+        self,
+        conn: aiosqlite.Connection,
+        job_id: int,
+        attempts: int,
+        error: str,
+        retry: bool
+    ):
+        delay = JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        await conn.execute("""
+            UPDATE jobs SET status = ?, run_after = ?, last_error = ?, updated_at = ?
+            WHERE id = ?
+        """, (
+            "queued" if retry else "failed",
+            time.time() + delay,
+            error,
+            datetime.now().isoformat(),
+            job_id
+        ))
+
+    async def stats(self) -> dict:
+        """Persisted job counts by state plus in-process counters"""
+        async with self.db.reader() as conn:
+            cursor = await conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+            )
+            counts = {row["status"]: row["count"] for row in await cursor.fetchall()}
+        return {
+            "workers": self.workers,
+            "process_workers": self.process_workers,
+            "running": len(self._running),
+            "queued": counts.get("queued", 0),
+            "failed": counts.get("failed", 0),
+            "completed_since_start": self.completed,
+            "retried_since_start": self.retried,
+            "failed_since_start": self.failed
+        }
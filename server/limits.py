@@ -0,0 +1,245 @@
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, FrozenSet, List, Optional, Pattern, Tuple
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+UploadRoute = Tuple[str, Pattern, Optional[int]]  # Method, path pattern, max body bytes
+
+class TokenBucket:
+    """Tokens available to one client and when they were last topped up"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    """Per-client token buckets refilled at ``rate`` tokens per second.
+
+    Each client may burst up to ``burst`` requests. Only the
+    ``max_clients`` most recently seen clients keep a bucket; a client
+    evicted from the table starts again with a full one.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.limited = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def acquire(self, client: str, cost: float = 1.0) -> Optional[float]:
+        """Spend ``cost`` tokens; returns None, or seconds until they are available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(client)
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return None
+        self.limited += 1
+        return (cost - bucket.tokens) / self.rate
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._buckets),
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "limited": self.limited
+        }
+
+class AdmissionRejected(Exception):
+    """No upload slot could be granted"""
+
+class UploadAdmission:
+    """Caps concurrent uploads, queueing a bounded number of extra ones.
+
+    Uploads beyond ``limit`` wait up to ``max_wait`` seconds for a slot;
+    once ``max_waiting`` are already waiting, further ones are rejected
+    immediately.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, max_wait: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold an upload slot for the duration of the block"""
+        if self._semaphore is None:
+            # Created on first use so it binds to the running loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejected()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+def client_identity(scope: Scope, api_keys: FrozenSet[str]) -> str:
+    """Rate limit key: a configured API key if one was sent, else the client IP.
+
+    Unknown keys fall back to the IP, so inventing keys cannot buy a
+    client fresh buckets.
+    """
+    headers = Headers(scope=scope)
+    key = headers.get("x-api-key")
+    if key is None:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            key = token.strip()
+    if key and key in api_keys:
+        return f"key:{key}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+class AdmissionControlMiddleware:
+    """Rate limits /api requests per client and admits uploads through
+    an UploadAdmission before their bodies are read.
+
+    Limited requests get 429 and rejected uploads 503, both with
+    Retry-After. Upload bodies over their route's size cap get 413: at
+    once if Content-Length declares them too large, and otherwise as soon
+    as the excess arrives, before a multipart parser spools it to disk.
+    Plain ASGI, so streamed responses pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: RateLimiter,
+        admission: UploadAdmission,
+        upload_routes: List[UploadRoute],
+        exempt_paths: FrozenSet[str],
+        api_keys: FrozenSet[str],
+        upload_retry_after: int
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.admission = admission
+        self.upload_routes = upload_routes
+        self.exempt_paths = exempt_paths
+        self.api_keys = api_keys
+        self.upload_retry_after = upload_retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith("/api/")
+            or path in self.exempt_paths
+            or scope["method"] == "OPTIONS"
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = self.limiter.acquire(client_identity(scope, self.api_keys))
+        if retry_after is not None:
+            await self._reject(scope, receive, send, 429, "Too many requests", retry_after)
+            return
+
+        route = next((
+            route for route in self.upload_routes
+            if scope["method"] == route[0] and route[1].fullmatch(path)
+        ), None)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        max_body = route[2]
+        if max_body is not None:
+            declared = Headers(scope=scope).get("content-length", "")
+            if declared.isdigit() and int(declared) > max_body:
+                await self._reject(scope, receive, send, 413, "Request body too large")
+                return
+            receive = limit_body(receive, max_body)
+
+        try:
+            async with self.admission.slot():
+                await self.app(scope, receive, send)
+        except AdmissionRejected:
+            await self._reject(
+                scope, receive, send, 503,
+                "Server is busy with other uploads", self.upload_retry_after
+            )
+
+    async def _reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        status_code: int,
+        detail: str,
+        retry_after: Optional[float] = None
+    ):
+        headers = {}
+        if retry_after is not None:
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        response = JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+        await response(scope, receive, send)
+
+def limit_body(receive: Receive, max_body: int) -> Receive:
+    """Wrap ``receive`` to fail with 413 once the body passes ``max_body`` bytes.
+
+    The HTTPException is raised to whatever is reading the body, so the
+    endpoint's own error handling turns it into the response.
+    """
+    received = 0
+
+    async def limited_receive() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_body:
+                raise HTTPException(status_code=413, detail="Request body too large")
+        return message
+
+    return limited_receive
+
+def route_pattern(path: str) -> Pattern:
+    """Compile a route path with ``{param}`` segments for matching"""
+    return re.compile(re.sub(r"\{[^/]+\}", "[^/]+", path))
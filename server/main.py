@@ -1,18 +1,53 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Request, Body
+from fastapi.responses import StreamingResponse, Response, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 import aiofiles
 import aiosqlite
+import asyncio
 import os
 import shutil
+import io
 import time
-import random
+import re
 from pathlib import Path
-from typing import List, Optional
-import magic
+from urllib.parse import quote
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
 import json
+import base64
+import zipfile
+import hashlib
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows; the upload directory lock is skipped
+    fcntl = None
+
+from server.documents import DocumentFilters, DocumentRecord, DocumentRepository, DocumentSummary
+from server.jobs import JOB_WORKERS, JobQueue, enqueue_job
+from server.limits import AdmissionControlMiddleware, RateLimiter, UploadAdmission, route_pattern
+from server.metrics import HttpMetrics, MetricsMiddleware, MetricsRegistry
+from server.migrations import MIGRATION_STEP_JOB, migrate_database, run_step
+from server.pdf_text import extract_pdf_text
+from server.pdf_validation import PdfStreamValidator, PdfValidationError
+from server.previews import PreviewCache, render_first_page
+from server.storage import (
+    LocalStorage,
+    S3Storage,
+    ShardedLocalStorage,
+    StorageBackend,
+    StoredObject,
+    fs_executor,
+    fs_pool_stats,
+    remove_file,
+    run_fs,
+)
 
 app = FastAPI(
     title="Medical Documents API",
@@ -20,6 +55,127 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Configuration
+UPLOAD_DIR = Path("server/uploads")
+INCOMING_DIR = UPLOAD_DIR / ".incoming"  # Uploads in flight, before dedup
+PREVIEW_DIR = UPLOAD_DIR / ".previews"  # First-page preview cache, kept locally for every backend
+# Held shared by running servers and exclusively by migrate_uploads.py
+UPLOAD_LOCK_PATH = UPLOAD_DIR / ".lock"
+UPLOAD_SHARD_DEPTH = 2  # Levels of two-hex-digit fan-out directories
+# Where document content is stored: "local" (flat UPLOAD_DIR), "sharded"
+# (UPLOAD_DIR with hash fan-out) or "s3" (S3-compatible bucket, needs boto3)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sharded")
+S3_BUCKET = os.environ.get("S3_BUCKET", "")
+S3_PREFIX = os.environ.get("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.environ.get("S3_REGION")
+S3_PRESIGNED_DOWNLOADS = os.environ.get("S3_PRESIGNED_DOWNLOADS") == "1"
+DATABASE_PATH = "server/medical_documents.db"
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_BATCH_FILES = 50  # Files accepted by one batch upload request
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for multipart framing and form fields
+# Request body caps, enforced before the multipart parser spools a body
+MAX_UPLOAD_REQUEST_BYTES = MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES
+MAX_BATCH_UPLOAD_BYTES = 100 * 1024 * 1024  # All files of one batch upload together
+BATCH_UPLOAD_CONCURRENCY = 4  # Files of a batch staged to disk at once
+MAX_BULK_DELETE_IDS = 1000  # Documents removed by one bulk delete request
+MAX_BULK_DOWNLOAD_IDS = 200  # Documents per ZIP export (stays well under 4GB)
+# Runs of a purge_blobs job before its keys are left in the failed job for
+# inspection; with the job queue's doubling backoff this spans about 40 minutes
+PURGE_JOB_MAX_ATTEMPTS = 10
+UPLOAD_SESSION_CHUNK_SIZE = 1024 * 1024  # Suggested chunk size for resumable uploads
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60  # Unfinished sessions expire after a day
+UPLOAD_SESSION_PURGE_INTERVAL_SECONDS = 60 * 60  # How often expired sessions are purged
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64KB read/write granularity for uploads
+ALLOWED_MIME_TYPES = ["application/pdf"]
+DB_READER_POOL_SIZE = 4  # Pre-opened read-only connections
+DB_BUSY_TIMEOUT_MS = 5000
+DB_STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per pooled connection
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"  # Revalidate via ETag on every view
+MAX_BYTE_RANGES = 16  # Larger multi-range requests get the whole file
+BYTE_RANGE_RE = re.compile(r"([0-9]*)-([0-9]*)")  # One range of a Range header
+MAX_PAGE_SIZE = 500  # Upper bound for ?limit= on the document listing
+LISTING_STREAM_BATCH_SIZE = 200  # Rows per query when streaming the full listing
+DOCUMENT_CACHE_SIZE = 1024  # Document rows kept in the in-process cache
+LISTING_CACHE_SIZE = 64  # Listing pages kept in the in-process cache
+CACHE_TTL_SECONDS = 300
+DB_WRITE_BATCH_SIZE = 32  # Max queued writes group-committed per transaction
+
+# Applied to every pooled connection. WAL lets readers proceed while the
+# writer commits, and synchronous=NORMAL only fsyncs at WAL checkpoints,
+# which is still durable across application crashes.
+SQLITE_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # 16MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+]
+
+LOOP_LAG_INTERVAL_SECONDS = 0.5  # Event loop lag sampling period
+
+# Processes for CPU-heavy background jobs; 0 runs them on a thread instead
+JOB_PROCESS_WORKERS = int(os.environ.get("JOB_PROCESS_WORKERS", "1"))
+# Re-read every stored upload to check it against its hash; off by default
+# since the hash was just computed from the same bytes
+VERIFY_UPLOADS = os.environ.get("VERIFY_UPLOADS") == "1"
+# Job kinds enqueued for every newly recorded document
+POST_UPLOAD_JOBS = ["index_document_text", "render_preview"]
+if VERIFY_UPLOADS:
+    POST_UPLOAD_JOBS.insert(0, "verify_document")
+MAX_INDEXED_TEXT_CHARS = 2 * 1024 * 1024  # Extracted text kept per document
+SEARCH_PAGE_SIZE = 20  # Default ?limit= for search results
+MAX_SEARCH_PAGE_SIZE = 100
+SEARCH_SNIPPET_TOKENS = 12  # Words of context per search snippet
+SEARCH_HIGHLIGHT = ("[", "]")  # Marks matched words in snippets
+SEARCH_NAME_WEIGHT = 10.0  # bm25 weight of filename matches relative to body text
+PREVIEW_MAX_DIMENSION = 320  # Longest side of preview images, in pixels
+PREVIEW_JPEG_QUALITY = 80
+PREVIEW_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Least recently served previews are evicted past this
+PREVIEW_CACHE_CONTROL = "private, max-age=86400"  # A document's content, and so its preview, never changes
+PREVIEW_RETRY_AFTER_SECONDS = 2  # Suggested wait when a preview is still being rendered
+PREVIEW_MAX_FAILED = 10000  # Unrenderable contents remembered, so their previews are not retried
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "20"))  # Sustained /api requests per client
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "100"))  # Requests a client may make at once (a page of previews)
+RATE_LIMIT_MAX_CLIENTS = 10000  # Token buckets kept, least recently seen dropped first
+RATE_LIMIT_EXEMPT_PATHS = frozenset({"/api/health", "/api/metrics"})
+# Comma-separated keys sent as X-API-Key or a Bearer token; each gets its
+# own rate limit bucket instead of sharing its client IP's
+API_KEYS = frozenset(key for key in os.environ.get("API_KEYS", "").split(",") if key)
+MAX_CONCURRENT_UPLOADS = 8  # Upload requests whose bodies are read at once
+MAX_QUEUED_UPLOADS = 32  # Uploads waiting for a slot before new ones get 503
+UPLOAD_QUEUE_TIMEOUT_SECONDS = 30.0
+UPLOAD_RETRY_AFTER_SECONDS = 5
+# Requests that stream file bodies, admitted through upload_admission,
+# with the largest body each accepts
+UPLOAD_ROUTES = [
+    ("POST", route_pattern("/api/documents/upload"), MAX_UPLOAD_REQUEST_BYTES),
+    ("POST", route_pattern("/api/documents/batch-upload"), MAX_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    ("PUT", route_pattern("/api/uploads/{upload_id}"), MAX_FILE_SIZE),
+    ("POST", route_pattern("/api/uploads/{upload_id}/complete"), None),
+]
+
+request_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+upload_admission = UploadAdmission(
+    MAX_CONCURRENT_UPLOADS, MAX_QUEUED_UPLOADS, UPLOAD_QUEUE_TIMEOUT_SECONDS
+)
+
+metrics = MetricsRegistry()
+http_metrics = HttpMetrics(metrics)
+
+# Added before CORSMiddleware, which therefore wraps it, so 429, 503 and
+# 413 responses still carry CORS headers. Uploads are admitted, and their
+# size capped, before the multipart body is parsed.
+app.add_middleware(
+    AdmissionControlMiddleware,
+    limiter=request_limiter,
+    admission=upload_admission,
+    upload_routes=UPLOAD_ROUTES,
+    exempt_paths=RATE_LIMIT_EXEMPT_PATHS,
+    api_keys=API_KEYS,
+    upload_retry_after=UPLOAD_RETRY_AFTER_SECONDS
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,153 +183,1287 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend wait as told before reloading a preview still
+    # being rendered
+    expose_headers=["Retry-After"],
 )
 
-# Configuration
-UPLOAD_DIR = Path("server/uploads")
-DATABASE_PATH = "server/medical_documents.db"
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-ALLOWED_MIME_TYPES = ["application/pdf"]
+# Outermost, so rate limited and rejected requests are counted too
+app.add_middleware(MetricsMiddleware, http_metrics=http_metrics)
 
 # Ensure upload directory exists
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+
+def lock_upload_dir(exclusive: bool) -> Optional[int]:
+    """Lock UPLOAD_DIR and return the descriptor holding the lock.
+
+    Servers take a shared lock for as long as they run; offline
+    maintenance that rewrites stored paths takes an exclusive one, so the
+    two never overlap. Raises BlockingIOError if the lock is held the
+    other way. Close the descriptor to release it. Returns None where
+    flock is unavailable.
+    """
+    if fcntl is None:
+        return None
+    fd = os.open(UPLOAD_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+def create_storage() -> StorageBackend:
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(UPLOAD_DIR)
+    if STORAGE_BACKEND == "sharded":
+        return ShardedLocalStorage(UPLOAD_DIR, UPLOAD_SHARD_DEPTH)
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(
+            S3_BUCKET,
+            prefix=S3_PREFIX,
+            endpoint_url=S3_ENDPOINT_URL,
+            region_name=S3_REGION,
+            presign_downloads=S3_PRESIGNED_DOWNLOADS
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+storage = create_storage()
+
+class RuntimeStats:
+    """Counters for event loop responsiveness"""
+
+    def __init__(self):
+        self.loop_lag_last = 0.0
+        self.loop_lag_max = 0.0
+        self.loop_lag_total = 0.0
+        self.loop_lag_samples = 0
+
+    def record_loop_lag(self, lag: float):
+        self.loop_lag_last = lag
+        self.loop_lag_max = max(self.loop_lag_max, lag)
+        self.loop_lag_total += lag
+        self.loop_lag_samples += 1
+
+    def stats(self) -> dict:
+        average = self.loop_lag_total / self.loop_lag_samples if self.loop_lag_samples else 0.0
+        return {
+            "fs_pool": fs_pool_stats.stats(),
+            "event_loop_lag_ms": {
+                "last": round(self.loop_lag_last * 1000, 3),
+                "max": round(self.loop_lag_max * 1000, 3),
+                "average": round(average * 1000, 3)
+            }
+        }
+
+runtime_stats = RuntimeStats()
+
+upload_stage_seconds = metrics.histogram(
+    "upload_stage_duration_seconds",
+    "Time spent per stage of recording one uploaded file",
+    ("stage",)
+)
+db_reader_wait_seconds = metrics.histogram(
+    "db_reader_wait_seconds", "Time waiting to check out a pooled reader connection"
+)
+db_write_wait_seconds = metrics.histogram(
+    "db_write_queue_wait_seconds", "Time a write op waits in the writer queue before it runs"
+)
+db_commit_seconds = metrics.histogram(
+    "db_commit_duration_seconds", "Time to COMMIT one group-committed write batch"
+)
+db_write_batch_size = metrics.histogram(
+    "db_write_batch_size", "Write ops group-committed per transaction",
+    buckets=(1, 2, 4, 8, 16, 32)
+)
+metrics.gauge(
+    "uploads_active", "Upload requests holding an admission slot",
+    callback=lambda: upload_admission.active
+)
+metrics.gauge(
+    "uploads_waiting", "Upload requests queued for an admission slot",
+    callback=lambda: upload_admission.waiting
+)
+metrics.gauge(
+    "fs_pool_in_flight", "Blocking file-system and storage calls in progress",
+    callback=lambda: fs_pool_stats.in_flight
+)
+
+async def monitor_loop_lag():
+    """Sample how late the event loop wakes up from a timed sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+        runtime_stats.record_loop_lag(
+            max(loop.time() - started - LOOP_LAG_INTERVAL_SECONDS, 0.0)
+        )
 
 # Database initialization
 async def init_database():
-    """Initialize the SQLite database with documents table"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                original_name TEXT NOT NULL,
-                filepath TEXT NOT NULL,
-                filesize INTEGER NOT NULL,
-                created_at DATETIME NOT NULL
+    """Create the database or bring its schema up to date"""
+    applied = await migrate_database(DATABASE_PATH)
+    if applied:
+        print(f"📊 Database migrated to version {applied[-1]}")
+    print("📊 Database initialized successfully")
+
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+class DatabasePool:
+    """Pre-opened aiosqlite connections shared across requests.
+
+    aiosqlite runs each connection on its own thread, so opening one per
+    request spawns a thread per request. The pool keeps a fixed set of
+    read-only connections that are checked out exclusively, and a single
+    writer connection owned by a background task.
+
+    Writes are submitted with ``write()`` and queued to that task, which
+    group-commits up to DB_WRITE_BATCH_SIZE queued operations per
+    transaction. Each operation runs inside its own savepoint, so one
+    failing operation does not roll back the others in its batch.
+    """
+
+    def __init__(self, database_path: str, reader_count: int):
+        self.database_path = database_path
+        self.reader_count = reader_count
+        self._readers: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._connections: List[aiosqlite.Connection] = []
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        # The writer manages its own transactions, so it runs in autocommit
+        # mode and issues BEGIN/COMMIT explicitly
+        db = await aiosqlite.connect(
+            self.database_path,
+            isolation_level="" if read_only else None,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        db.row_factory = aiosqlite.Row
+        for pragma in SQLITE_PRAGMAS:
+            await db.execute(pragma)
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        self._connections.append(db)
+        return db
+
+    async def open(self):
+        """Open the reader connections and start the writer task"""
+        writer = await self._connect(read_only=False)
+        self._readers = asyncio.Queue()
+        for _ in range(self.reader_count):
+            self._readers.put_nowait(await self._connect(read_only=True))
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._run_writer(writer))
+
+    async def close(self):
+        """Drain queued writes, then close every pooled connection"""
+        if self._writer_task is not None:
+            self._write_queue.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+        for db in self._connections:
+            await db.close()
+        self._connections.clear()
+        self._readers = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Check out a read-only connection for the duration of the block"""
+        with db_reader_wait_seconds.time():
+            db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    async def write(self, op: WriteOp) -> Any:
+        """Run ``op`` on the writer connection and return its result.
+
+        The returned value is only delivered once the transaction that
+        contains the operation has committed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((op, future, time.perf_counter()))
+        return await future
+
+    async def _run_writer(self, db: aiosqlite.Connection):
+        stopping = False
+        while not stopping:
+            item = await self._write_queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            while len(batch) < DB_WRITE_BATCH_SIZE:
+                try:
+                    item = self._write_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._commit_batch(db, batch)
+
+    async def _commit_batch(
+        self,
+        db: aiosqlite.Connection,
+        batch: List[Tuple[WriteOp, asyncio.Future, float]]
+    ):
+        outcomes = []
+        db_write_batch_size.observe(len(batch))
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            for op, future, enqueued_at in batch:
+                if future.cancelled():
+                    continue
+                db_write_wait_seconds.observe(time.perf_counter() - enqueued_at)
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await op(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((future, e, None))
+                    continue
+                await db.execute("RELEASE write_op")
+                outcomes.append((future, None, result))
+            with db_commit_seconds.time():
+                await db.execute("COMMIT")
+        except Exception as e:
+            print(f"Database write batch error: {e}")
+            if db.in_transaction:
+                await db.rollback()
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, error, result in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+db_pool = DatabasePool(DATABASE_PATH, DB_READER_POOL_SIZE)
+job_queue = JobQueue(db_pool, JOB_WORKERS, JOB_PROCESS_WORKERS)
+
+class DocumentCache:
+    """In-process LRU/TTL cache for document rows and listing pages.
+
+    Rows are keyed by document id; listing pages by their query
+    parameters. Every write bumps ``version`` and drops all listing pages,
+    and readers pass the version they observed before querying to
+    ``put_*`` so a result read before a concurrent write is never cached
+    after it.
+    """
+
+    def __init__(self, max_rows: int, max_listings: int, ttl: float):
+        self.max_rows = max_rows
+        self.max_listings = max_listings
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.listing_hits = 0
+        self.listing_misses = 0
+        self._rows: "OrderedDict[int, Tuple[float, DocumentRecord]]" = OrderedDict()
+        self._listings: "OrderedDict[tuple, Tuple[float, dict]]" = OrderedDict()
+
+    def _get(self, entries: OrderedDict, key) -> Any:
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries: OrderedDict, key, value: Any, max_size: int):
+        entries[key] = (time.monotonic() + self.ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def get_row(self, document_id: int) -> Optional[DocumentRecord]:
+        row = self._get(self._rows, document_id)
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def put_row(self, document_id: int, row: DocumentRecord, version: int):
+        if version == self.version:
+            self._put(self._rows, document_id, row, self.max_rows)
+
+    def get_listing(self, key: tuple) -> Optional[dict]:
+        listing = self._get(self._listings, key)
+        if listing is None:
+            self.listing_misses += 1
+        else:
+            self.listing_hits += 1
+        return listing
+
+    def put_listing(self, key: tuple, listing: dict, version: int):
+        if version == self.version:
+            self._put(self._listings, key, listing, self.max_listings)
+
+    def invalidate(self, document_id: Optional[int] = None):
+        """Record a write: drop listing pages and, if given, one row"""
+        self.version += 1
+        self._listings.clear()
+        if document_id is not None:
+            self._rows.pop(document_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "rows": {
+                "size": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses
+            },
+            "listings": {
+                "size": len(self._listings),
+                "hits": self.listing_hits,
+                "misses": self.listing_misses
+            }
+        }
+
+document_cache = DocumentCache(DOCUMENT_CACHE_SIZE, LISTING_CACHE_SIZE, CACHE_TTL_SECONDS)
+document_repository = DocumentRepository(db_pool.reader)
+preview_cache = PreviewCache(PREVIEW_DIR, PREVIEW_CACHE_MAX_BYTES, PREVIEW_MAX_FAILED)
+
+async def get_document(document_id: int) -> Optional[DocumentRecord]:
+    """Fetch a document, serving repeat lookups from document_cache"""
+    document = document_cache.get_row(document_id)
+    if document is not None:
+        return document
+
+    version = document_cache.version
+    document = await document_repository.get(document_id)
+    if document is not None:
+        document_cache.put_row(document_id, document, version)
+    return document
+
+async def get_database() -> DatabasePool:
+    """Get the shared database connection pool.
+
+    Handlers check out readers only around their queries and submit writes
+    to the pool's writer queue, so a slow upload or download never pins a
+    pooled connection.
+    """
+    return db_pool
+
+def validate_pdf_file(file: UploadFile) -> bool:
+    """Validate that the uploaded file has a PDF filename.
+
+    The content is checked by ``save_upload_stream`` with a
+    PdfStreamValidator as it streams, so the body never has to be read
+    twice.
+    """
+    return bool(file.filename) and file.filename.lower().endswith('.pdf')
+
+def _spooled_fileno(file: UploadFile) -> Optional[int]:
+    """Return the OS file descriptor backing an upload, if it has one.
+
+    Small uploads stay in the multipart parser's in-memory spool; asking a
+    SpooledTemporaryFile for its fileno would force it to disk, so those
+    return None and take the chunked path instead.
+    """
+    spool = file.file
+    if isinstance(spool, SpooledTemporaryFile) and not getattr(spool, '_rolled', False):
+        return None
+    try:
+        return spool.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def _copy_fd_range(src_fd: int, dst_fd: int, count: int) -> None:
+    """Copy ``count`` bytes from ``src_fd`` to ``dst_fd`` inside the kernel.
+
+    Tries copy_file_range (which can reflink on filesystems that support
+    it), then sendfile, and only falls back to a pread/write loop when
+    neither syscall is available for this pair of files.
+    """
+    copied = 0
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < count:
+                sent = os.copy_file_range(src_fd, dst_fd, count - copied, copied, copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            pass
+
+    if copied < count and hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst_fd, copied, os.SEEK_SET)
+            while copied < count:
+                sent = os.sendfile(dst_fd, src_fd, copied, count - copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            pass
+
+    os.lseek(dst_fd, copied, os.SEEK_SET)
+    while copied < count:
+        chunk = os.pread(src_fd, min(UPLOAD_CHUNK_SIZE, count - copied), copied)
+        if not chunk:
+            raise IOError("Upload spool truncated while copying")
+        os.write(dst_fd, chunk)
+        copied += len(chunk)
+
+def invalid_pdf(error: PdfValidationError) -> HTTPException:
+    """The 400 response for an upload that failed PDF validation"""
+    return HTTPException(
+        status_code=400,
+        detail=f"Invalid PDF file: {error}"
+    )
+
+def _probe_spooled_upload(src_fd: int) -> Tuple[int, str]:
+    """Validate an on-disk upload spool and return its size and SHA-256.
+
+    The size comes from fstat, so oversized spools are rejected unread;
+    otherwise the spool is read once, to validate and hash it, before
+    deciding whether it needs copying at all.
+    """
+    file_size = os.fstat(src_fd).st_size
+
+    if file_size == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Empty file not allowed"
+        )
+
+    if file_size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail="File size exceeds 10MB limit"
+        )
+
+    validator = PdfStreamValidator()
+    digest = hashlib.sha256()
+    try:
+        for offset in range(0, file_size, UPLOAD_CHUNK_SIZE):
+            chunk = os.pread(src_fd, UPLOAD_CHUNK_SIZE, offset)
+            validator.feed(chunk)
+            digest.update(chunk)
+        validator.finish()
+    except PdfValidationError as e:
+        raise invalid_pdf(e)
+
+    return file_size, digest.hexdigest()
+
+def _copy_spool_to(src_fd: int, file_path: Path, file_size: int):
+    """Copy a validated upload spool into place with a kernel-side copy"""
+    dst_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        _copy_fd_range(src_fd, dst_fd, file_size)
+    except BaseException:
+        os.close(dst_fd)
+        file_path.unlink()
+        raise
+    os.close(dst_fd)
+
+async def save_upload_stream(
+    file: UploadFile,
+    file_path: Path,
+    skip_copy: Optional[Callable[[str], Awaitable[bool]]] = None
+) -> Tuple[int, str]:
+    """Stream an upload to disk in bounded chunks.
+
+    Returns the file size and its hex SHA-256, computed as chunks pass.
+
+    PDF structure (see PdfStreamValidator) and MAX_FILE_SIZE are checked
+    as the file is read, and peak memory per upload stays at
+    UPLOAD_CHUNK_SIZE regardless of file size. The multipart parser has
+    usually spooled the whole request body by the time this runs, so the
+    request size itself is capped earlier, by AdmissionControlMiddleware.
+    Uploads the parser spooled to disk are hashed first and then copied
+    by the kernel, unless ``skip_copy`` reports that the content is
+    already stored, in which case nothing is written. A partially written
+    file is removed if the upload is rejected.
+    """
+    src_fd = _spooled_fileno(file)
+    if src_fd is not None:
+        with upload_stage_seconds.time(stage="probe"):
+            file_size, content_hash = await run_fs(_probe_spooled_upload, src_fd)
+        if skip_copy is None or not await skip_copy(content_hash):
+            with upload_stage_seconds.time(stage="disk_write"):
+                await run_fs(_copy_spool_to, src_fd, file_path, file_size)
+        return file_size, content_hash
+
+    file_size = 0
+    validator = PdfStreamValidator()
+    digest = hashlib.sha256()
+    # Unspooled uploads are validated, hashed and written in one pass
+    try:
+        with upload_stage_seconds.time(stage="disk_write"):
+            async with aiofiles.open(file_path, 'wb', executor=fs_executor) as f:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    file_size += len(chunk)
+                    if file_size > MAX_FILE_SIZE:
+                        raise HTTPException(
+                            status_code=400,
+                            detail="File size exceeds 10MB limit"
+                        )
+
+                    try:
+                        validator.feed(chunk)
+                    except PdfValidationError as e:
+                        raise invalid_pdf(e)
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+        if file_size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Empty file not allowed"
+            )
+
+        try:
+            validator.finish()
+        except PdfValidationError as e:
+            raise invalid_pdf(e)
+    except BaseException:
+        await run_fs(remove_file, file_path)
+        raise
+
+    return file_size, digest.hexdigest()
+
+def encode_cursor(created_at: str, document_id: int) -> str:
+    """Encode a listing position as an opaque pagination cursor"""
+    raw = json.dumps([created_at, document_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(padded))
+        # bool is an int subclass, but never a document id
+        if not isinstance(created_at, str) or type(document_id) is not int:
+            raise ValueError("malformed cursor")
+        return created_at, document_id
+    except (ValueError, TypeError, RecursionError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+class BlobMissingError(Exception):
+    """A deduplicated upload's stored copy vanished before it was recorded"""
+
+async def blob_exists(db: DatabasePool, content_hash: str) -> bool:
+    """True if content with this hash is already stored"""
+    async with db.reader() as conn:
+        cursor = await conn.execute(
+            "SELECT filepath FROM blobs WHERE content_hash = ?",
+            (content_hash,)
+        )
+        blob = await cursor.fetchone()
+    return blob is not None and await storage.exists(blob["filepath"])
+
+async def claim_blob(
+    conn: aiosqlite.Connection,
+    content_hash: str,
+    file_size: int,
+    incoming_path: Path,
+    published: bool
+) -> str:
+    """Add a reference to the blob for ``content_hash`` inside a write op.
+
+    Returns the blob's storage key. A new blob on a local backend is
+    created by renaming ``incoming_path`` into place; other backends must
+    already hold the object, ``published`` by publish_staged_upload. For
+    an existing blob the refcount is bumped and the incoming copy, if any,
+    is left for the caller to discard.
+
+    Only local files are checked for here: an existing blob's row is
+    trusted on other backends, where publish_staged_upload already
+    checked the object before the write op.
+    """
+    cursor = await conn.execute(
+        "SELECT filepath FROM blobs WHERE content_hash = ?",
+        (content_hash,)
+    )
+    blob = await cursor.fetchone()
+
+    if blob is not None:
+        if storage.adopts_instantly:
+            stored = await storage.exists(blob["filepath"])
+        else:
+            stored = not published
+        if stored:
+            await conn.execute(
+                "UPDATE blobs SET refcount = refcount + 1 WHERE content_hash = ?",
+                (content_hash,)
+            )
+            return blob["filepath"]
+
+    key = storage.key_for(content_hash)
+    if key in purging_blobs:
+        # Its object is being deleted; restage_upload waits for that
+        raise BlobMissingError(content_hash)
+    if storage.adopts_instantly:
+        if not await run_fs(incoming_path.exists):
+            raise BlobMissingError(content_hash)
+        await storage.put_file(key, incoming_path)
+    elif not published:
+        raise BlobMissingError(content_hash)
+
+    if blob is None:
+        await conn.execute("""
+            INSERT INTO blobs (content_hash, filepath, filesize, refcount)
+            VALUES (?, ?, ?, 1)
+        """, (content_hash, key, file_size))
+    else:
+        # The row outlived its object; the fresh copy restores it
+        await conn.execute(
+            "UPDATE blobs SET filepath = ?, refcount = refcount + 1 WHERE content_hash = ?",
+            (key, content_hash)
+        )
+    return key
+
+async def release_blob(conn: aiosqlite.Connection, document: DocumentRecord) -> Optional[str]:
+    """Drop a document's blob reference inside a write op.
+
+    Returns the storage key to purge once the transaction commits, or None
+    while other documents still share the object. Documents stored before
+    deduplication own their file outright.
+    """
+    content_hash = document.content_hash
+    if content_hash:
+        cursor = await conn.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = ?",
+            (content_hash,)
+        )
+        if cursor.rowcount:
+            cursor = await conn.execute(
+                "DELETE FROM blobs WHERE content_hash = ? AND refcount <= 0",
+                (content_hash,)
             )
-        """)
-        await db.commit()
-        print("📊 Database initialized successfully")
-
-async def get_database():
-    """Get database connection"""
-    db = await aiosqlite.connect(DATABASE_PATH)
-    db.row_factory = aiosqlite.Row
+            return document.filepath if cursor.rowcount else None
+    return document.filepath
+
+# Storage keys whose objects purge_released_blobs is deleting, each with
+# an event set once it is done
+purging_blobs: Dict[str, asyncio.Event] = {}
+# Storage keys holding a fresh copy published by uploads not yet recorded,
+# with how many such uploads; purges leave them alone
+publishing_blobs: Dict[str, int] = {}
+
+async def wait_for_purge(key: str):
+    """Wait until no purge of ``key`` is in progress"""
+    while key in purging_blobs:
+        await purging_blobs[key].wait()
+
+async def purge_released_blobs(db: DatabasePool, keys: List[str]):
+    """Delete stored objects whose last reference was released.
+
+    Which keys are still unreferenced is decided in a write op, so it is
+    serialized with claim_blob: an object an upload re-claimed after the
+    release committed is left alone, as is one an upload has published
+    since. The objects are deleted after that op commits, outside the
+    writer and all at once (see StorageBackend.delete_many); until they
+    are, claim_blob refuses their keys.
+    """
+    if not keys:
+        return
+    purging: List[str] = []
+
+    async def claim_unreferenced(conn: aiosqlite.Connection):
+        cursor = await conn.execute(
+            "SELECT filepath FROM blobs WHERE filepath IN (SELECT value FROM json_each(?))",
+            (json.dumps(keys),)
+        )
+        referenced = {row["filepath"] for row in await cursor.fetchall()}
+        for key in keys:
+            if key in referenced or key in purging_blobs or key in publishing_blobs:
+                continue
+            purging_blobs[key] = asyncio.Event()
+            purging.append(key)
+
     try:
-        yield db
+        await db.write(claim_unreferenced)
+        await storage.delete_many(purging)
+        # Keys are named after the content hash, as are previews
+        await asyncio.gather(*(preview_cache.discard(Path(key).stem) for key in purging))
     finally:
-        await db.close()
+        for key in purging:
+            purging_blobs.pop(key).set()
 
-def validate_pdf_file(file: UploadFile) -> bool:
-    """Validate that the uploaded file is a PDF"""
-    # Check file extension
-    if not file.filename.lower().endswith('.pdf'):
-        return False
-    
-    # Check MIME type from the file content
+async def purge_or_queue_blobs(db: DatabasePool, keys: List[str]):
+    """Purge released objects now, or hand them to a purge_blobs job.
+
+    The references are already gone when this runs, so a failed storage
+    delete must not fail the request that released them; the job retries
+    it with backoff, and survives restarts.
+    """
     try:
-        # Read first few bytes to check magic number
-        file.file.seek(0)
-        header = file.file.read(1024)
-        file.file.seek(0)  # Reset file pointer
-        
-        # PDF files start with %PDF
-        if header.startswith(b'%PDF'):
+        await purge_released_blobs(db, keys)
+    except Exception as e:
+        print(f"Purge error, queued for retry: {e}")
+
+        async def queue_purge(conn: aiosqlite.Connection):
+            await enqueue_job(conn, "purge_blobs", {"keys": keys})
+
+        try:
+            await db.write(queue_purge)
+        except Exception as e:
+            print(f"Purge queue error, objects left in storage: {keys}: {e}")
+            return
+        job_queue.wake()
+
+async def purge_blobs_job(payload: dict):
+    """Retry the purge of objects whose deletion failed"""
+    await purge_released_blobs(db_pool, payload["keys"])
+
+job_queue.register("purge_blobs", purge_blobs_job, max_attempts=PURGE_JOB_MAX_ATTEMPTS)
+
+def document_listing_entry(document: DocumentSummary) -> dict:
+    """Shape a listing row for the API response"""
+    return {
+        "id": document.id,
+        "filename": document.filename,
+        "filesize": document.filesize,
+        "created_at": document.created_at
+    }
+
+async def stream_documents_json(
+    filters: DocumentFilters,
+    position: Optional[Tuple[str, int]]
+) -> AsyncIterator[bytes]:
+    """Yield the full listing as a JSON body, one batch of rows at a time.
+
+    Each batch is its own keyset query on a freshly checked-out reader, so
+    memory stays at LISTING_STREAM_BATCH_SIZE rows and a slow client never
+    pins a pooled connection between batches.
+    """
+    yield b'{"documents":['
+    first = True
+    try:
+        while True:
+            rows = await document_repository.list_page(
+                filters, position, LISTING_STREAM_BATCH_SIZE
+            )
+            if not rows:
+                break
+
+            chunk = ",".join(json.dumps(document_listing_entry(row)) for row in rows)
+            yield (chunk if first else "," + chunk).encode()
+            first = False
+
+            if len(rows) < LISTING_STREAM_BATCH_SIZE:
+                break
+            position = (rows[-1].created_at, rows[-1].id)
+    except Exception as e:
+        # Headers are already sent; ending early leaves the body invalid
+        # JSON, which the client sees as a failed request
+        print(f"Stream documents error: {e}")
+        return
+    yield b'],"next_cursor":null}'
+
+def document_etag(document: DocumentRecord, stored: StoredObject) -> str:
+    """Strong ETag from the stored content hash, weak stat-based otherwise"""
+    if document.content_hash:
+        return f'"{document.content_hash}"'
+    return f'W/"{stored.size:x}-{int(stored.mtime):x}"'
+
+def content_disposition(filename: str) -> str:
+    """Attachment Content-Disposition, matching what FileResponse sends"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``"""
+    if header_value.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header_value.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
             return True
-        
+    return False
+
+def not_modified_since(header_value: str, mtime: float) -> bool:
+    """True if a file modified at ``mtime`` is unchanged since the header date"""
+    try:
+        since = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
         return False
-    except Exception:
+    if since is None:
         return False
+    return int(mtime) <= since.timestamp()
+
+def parse_range_header(header_value: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``bytes=`` Range header into inclusive (start, end) pairs.
 
-def generate_unique_filename(original_filename: str) -> str:
-    """Generate a unique filename to prevent conflicts"""
-    timestamp = int(time.time())
-    random_suffix = random.randint(1000, 9999)
-    name, ext = os.path.splitext(original_filename)
-    return f"{timestamp}-{random_suffix}-{name}{ext}"
+    Returns None when the header should be ignored (malformed, another
+    unit, or too many ranges) and an empty list when no range overlaps
+    the file, which the caller answers with 416.
+    """
+    unit, _, spec = header_value.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        # Plain digits only; int() alone would also take "+5" and "1_0"
+        match = BYTE_RANGE_RE.fullmatch(part.strip())
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = int(last) if last else file_size - 1
+            if last and end < start:
+                return None
+        elif last:
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            start = max(file_size - suffix, 0)
+            end = file_size - 1
+        else:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+
+    if len(ranges) > MAX_BYTE_RANGES:
+        return None
+    return ranges
+
+async def iter_multipart_ranges(
+    key: str,
+    parts: List[Tuple[bytes, int, int]],
+    closing: bytes
+) -> AsyncIterator[bytes]:
+    for part_header, start, end in parts:
+        yield part_header
+        async for chunk in storage.get_stream(key, start, end):
+            yield chunk
+    yield closing
+
+def range_response(
+    key: str,
+    ranges: List[Tuple[int, int]],
+    file_size: int,
+    headers: dict
+) -> Response:
+    """Build a 206 response for one range or a multipart/byteranges body"""
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+        headers["content-length"] = str(end - start + 1)
+        return StreamingResponse(
+            storage.get_stream(key, start, end),
+            status_code=206,
+            media_type="application/pdf",
+            headers=headers
+        )
+
+    boundary = secrets.token_hex(16)
+    parts = []
+    content_length = 0
+    for start, end in ranges:
+        part_header = (
+            f"--{boundary}\r\n"
+            f"Content-Type: application/pdf\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+        ).encode()
+        # Every part after the first is preceded by the CRLF that ends the
+        # previous part's body
+        if parts:
+            part_header = b"\r\n" + part_header
+        parts.append((part_header, start, end))
+        content_length += len(part_header) + end - start + 1
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    content_length += len(closing)
+
+    headers["content-length"] = str(content_length)
+    return StreamingResponse(
+        iter_multipart_ranges(key, parts, closing),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )
+
+loop_lag_task: Optional[asyncio.Task] = None
+session_purge_task: Optional[asyncio.Task] = None
+upload_lock_fd: Optional[int] = None
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
+    global upload_lock_fd
+    try:
+        upload_lock_fd = lock_upload_dir(exclusive=False)
+    except BlockingIOError:
+        raise RuntimeError("migrate_uploads.py is running; start the server once it finishes")
     await init_database()
+    await db_pool.open()
+    await run_fs(preview_cache.load)
+    await job_queue.start()
+    global loop_lag_task, session_purge_task
+    loop_lag_task = asyncio.create_task(monitor_loop_lag())
+    session_purge_task = asyncio.create_task(purge_upload_sessions_periodically())
     print("🏥 Medical Documents API started successfully")
     print(f"📁 Upload directory: {UPLOAD_DIR.absolute()}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled database connections on shutdown"""
+    for task in (loop_lag_task, session_purge_task):
+        if task is not None:
+            task.cancel()
+    await job_queue.stop()
+    await db_pool.close()
+    if upload_lock_fd is not None:
+        os.close(upload_lock_fd)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "OK",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "runtime": runtime_stats.stats(),
+        "limits": {
+            "requests": request_limiter.stats(),
+            "uploads": upload_admission.stats()
+        }
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Request, upload stage and database metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Document and preview cache sizes and hit/miss counters"""
+    return {**document_cache.stats(), "previews": preview_cache.stats()}
+
+@app.get("/api/jobs/stats")
+async def job_stats():
+    """Background job backlog and outcome counters"""
+    return await job_queue.stats()
+
+class StagedUpload:
+    """An upload streamed into INCOMING_DIR, awaiting its database row.
+
+    ``document`` is the multipart upload it came from, if any; it is only
+    needed to rewrite a skipped incoming copy (see restage_upload).
+    """
+
+    def __init__(
+        self,
+        original_name: str,
+        incoming_path: Path,
+        file_size: int,
+        content_hash: str,
+        document: Optional[UploadFile] = None
+    ):
+        self.original_name = original_name
+        self.document = document
+        self.incoming_path = incoming_path
+        self.file_size = file_size
+        self.content_hash = content_hash
+        self.created_at = datetime.now().isoformat()
+        self.published = False  # Set once a fresh copy is put into storage
+
+    def release_published(self):
+        """Let purges delete the published copy again, once it is recorded
+        or the upload is abandoned
+        """
+        if not self.published:
+            return
+        self.published = False
+        key = storage.key_for(self.content_hash)
+        publishing_blobs[key] -= 1
+        if not publishing_blobs[key]:
+            del publishing_blobs[key]
+
+    async def discard(self):
+        """Remove the incoming copy, if one is still on disk"""
+        self.release_published()
+        await run_fs(remove_file, self.incoming_path)
+
+async def stage_upload(document: UploadFile, db: DatabasePool) -> StagedUpload:
+    """Validate an upload and stream it to a private incoming file.
+
+    The final name depends on the content hash, which is only known once
+    the body is read, so the row is inserted separately by
+    insert_staged_upload.
+    """
+    # Validate file type
+    with upload_stage_seconds.time(stage="validate"):
+        valid = validate_pdf_file(document)
+    if not valid:
+        raise HTTPException(
+            status_code=400,
+            detail="Only PDF files are allowed"
+        )
+
+    # Named at random: the client's filename may hold path separators
+    incoming_path = INCOMING_DIR / f"{secrets.token_hex(16)}.part"
+
+    async def content_stored(content_hash: str) -> bool:
+        return await blob_exists(db, content_hash)
+
+    # Copy the file to disk, checking its size and PDF structure as it is read
+    file_size, content_hash = await save_upload_stream(
+        document, incoming_path, skip_copy=content_stored
+    )
+    staged = StagedUpload(document.filename, incoming_path, file_size, content_hash, document)
+    await publish_staged_upload(staged, db)
+    return staged
+
+async def publish_staged_upload(staged: StagedUpload, db: DatabasePool):
+    """Hand a staged file to backends that cannot adopt it by renaming.
+
+    Runs before the write op that records the upload, so slow object store
+    transfers never hold up the writer task. Content that is already
+    stored is not sent again.
+    """
+    if storage.adopts_instantly or await blob_exists(db, staged.content_hash):
+        return
+    key = storage.key_for(staged.content_hash)
+    # A copy put while a purge of the key runs could be deleted by it;
+    # once published, purges skip the key until the upload is recorded
+    await wait_for_purge(key)
+    if not staged.published:
+        publishing_blobs[key] = publishing_blobs.get(key, 0) + 1
+        staged.published = True
+    try:
+        with upload_stage_seconds.time(stage="publish"):
+            await storage.put_file(key, staged.incoming_path)
+    except BaseException:
+        staged.release_published()
+        raise
+
+async def restage_upload(staged: StagedUpload, db: DatabasePool):
+    """Rewrite and republish the copy a deduplicated upload skipped.
+
+    Needed when the stored copy it matched was deleted before its row was
+    inserted, or is being deleted (claim_blob raised BlobMissingError).
+    """
+    await wait_for_purge(storage.key_for(staged.content_hash))
+    if staged.document is not None and not await run_fs(staged.incoming_path.exists):
+        await staged.document.seek(0)
+        await save_upload_stream(staged.document, staged.incoming_path)
+    await publish_staged_upload(staged, db)
+
+async def write_staged_upload(db: DatabasePool, staged: StagedUpload, op: WriteOp):
+    """Run a write op recording ``staged``, recovering once from BlobMissingError"""
+    try:
+        with upload_stage_seconds.time(stage="db_write"):
+            return await db.write(op)
+    except BlobMissingError:
+        await restage_upload(staged, db)
+        with upload_stage_seconds.time(stage="db_write"):
+            return await db.write(op)
+
+async def insert_staged_upload(conn: aiosqlite.Connection, staged: StagedUpload) -> DocumentRecord:
+    """Record a staged upload inside a write op and return its row"""
+    with upload_stage_seconds.time(stage="insert"):
+        key = await claim_blob(
+            conn, staged.content_hash, staged.file_size, staged.incoming_path, staged.published
+        )
+        document = await document_repository.insert(
+            conn,
+            filename=Path(key).name,
+            original_name=staged.original_name,
+            filepath=key,
+            filesize=staged.file_size,
+            created_at=staged.created_at,
+            content_hash=staged.content_hash
+        )
+        # Follow-up processing commits with the row; callers wake job_queue
+        for kind in POST_UPLOAD_JOBS:
+            await enqueue_job(conn, kind, {"document_id": document.id})
+    return document
+
+def uploaded_document_entry(document: DocumentRecord) -> dict:
+    """Shape a freshly inserted row for upload responses"""
+    return {
+        "id": document.id,
+        "filename": document.original_name,
+        "filesize": document.filesize,
+        "created_at": document.created_at
     }
 
+async def verify_document_job(payload: dict):
+    """Re-read a stored document and check it against its content hash.
+
+    Catches stored copies that were truncated or corrupted after upload;
+    only queued with VERIFY_UPLOADS. Documents deleted in the meantime
+    are skipped.
+    """
+    document = await get_document(payload["document_id"])
+    if document is None or not document.content_hash:
+        return
+
+    digest = hashlib.sha256()
+    try:
+        async for chunk in storage.get_stream(document.filepath):
+            digest.update(chunk)
+    except FileNotFoundError:
+        if await get_document(document.id) is None:
+            return
+        raise
+    if digest.hexdigest() != document.content_hash:
+        raise ValueError(f"Stored copy of document {document.id} does not match its content hash")
+
+job_queue.register("verify_document", verify_document_job)
+
+async def migration_step_job(payload: dict):
+    """Run one batch of a schema migration's online step"""
+    async def step(conn: aiosqlite.Connection) -> bool:
+        return await run_step(conn, payload)
+
+    if await db_pool.write(step):
+        job_queue.wake()
+
+job_queue.register(MIGRATION_STEP_JOB, migration_step_job)
+
+@asynccontextmanager
+async def local_copy(key: str) -> AsyncIterator[Path]:
+    """A local file holding a stored object, fetched to INCOMING_DIR if needed"""
+    path = storage.local_path(key)
+    if path is not None:
+        yield path
+        return
+
+    temp_path = INCOMING_DIR / f"{secrets.token_hex(16)}.fetch"
+    try:
+        async with aiofiles.open(temp_path, 'wb', executor=fs_executor) as f:
+            async for chunk in storage.get_stream(key):
+                await f.write(chunk)
+        yield temp_path
+    finally:
+        await run_fs(remove_file, temp_path)
+
+async def index_document_text_job(payload: dict):
+    """Extract a document's text and add it to documents_fts.
+
+    Identical content already indexed for another document is copied
+    instead of extracted again. Extraction runs in the job process pool.
+    """
+    document_id = payload["document_id"]
+
+    async def copy_indexed_text(conn: aiosqlite.Connection) -> bool:
+        return await document_repository.copy_indexed_text(conn, document_id)
+
+    if await db_pool.write(copy_indexed_text):
+        return
+
+    document = await get_document(document_id)
+    if document is None:
+        return
+    try:
+        async with local_copy(document.filepath) as path:
+            text = await job_queue.run_in_pool(extract_pdf_text, str(path), MAX_INDEXED_TEXT_CHARS)
+    except FileNotFoundError:
+        if await get_document(document_id) is None:
+            return
+        raise
+
+    async def insert_text(conn: aiosqlite.Connection):
+        await document_repository.index_text(conn, document_id, text)
+
+    await db_pool.write(insert_text)
+
+job_queue.register("index_document_text", index_document_text_job)
+
+async def render_preview_job(payload: dict):
+    """Render a document's first page into preview_cache.
+
+    Documents sharing content share one preview. Rendering runs in the
+    job process pool.
+    """
+    document = await get_document(payload["document_id"])
+    if document is None or not document.content_hash:
+        return
+    content_hash = document.content_hash
+    if content_hash in preview_cache:
+        preview_cache.pending.discard(content_hash)
+        return
+
+    rendered = preview_cache.temp_path(content_hash)
+    try:
+        async with local_copy(document.filepath) as path:
+            await job_queue.run_in_pool(
+                render_first_page, str(path), str(rendered),
+                PREVIEW_MAX_DIMENSION, PREVIEW_JPEG_QUALITY
+            )
+        # Content deleted while rendering must not leave a preview behind
+        if await blob_exists(db_pool, content_hash):
+            await preview_cache.add(content_hash, rendered)
+    except FileNotFoundError:
+        if await get_document(document.id) is None:
+            return
+        raise
+    finally:
+        await run_fs(remove_file, rendered)
+
+async def render_preview_failed(payload: dict):
+    """Stop queueing renders of content whose preview cannot be rendered,
+    such as encrypted PDFs
+    """
+    document = await get_document(payload["document_id"])
+    if document is not None and document.content_hash:
+        preview_cache.render_failed(document.content_hash)
+
+job_queue.register("render_preview", render_preview_job, on_failure=render_preview_failed)
+
 @app.post("/api/documents/upload")
 async def upload_document(
     document: UploadFile = File(...),
-    db: aiosqlite.Connection = Depends(get_database)
+    db: DatabasePool = Depends(get_database)
 ):
     """Upload a PDF document"""
+    staged = None
     try:
-        # Validate file type
-        if not validate_pdf_file(document):
-            raise HTTPException(
-                status_code=400,
-                detail="Only PDF files are allowed"
-            )
-        
-        # Check file size
-        document.file.seek(0, 2)  # Seek to end
-        file_size = document.file.tell()
-        document.file.seek(0)  # Reset to beginning
-        
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail="File size exceeds 10MB limit"
-            )
-        
-        if file_size == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Empty file not allowed"
-            )
-        
-        # Generate unique filename
-        unique_filename = generate_unique_filename(document.filename)
-        file_path = UPLOAD_DIR / unique_filename
+        staged = await stage_upload(document, db)
         
-        # Save file to disk
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await document.read()
-            await f.write(content)
+        async def insert_document(conn: aiosqlite.Connection):
+            return await insert_staged_upload(conn, staged)
         
         # Save metadata to database
-        created_at = datetime.now().isoformat()
-        cursor = await db.execute("""
-            INSERT INTO documents (filename, original_name, filepath, filesize, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (unique_filename, document.filename, str(file_path), file_size, created_at))
-        
-        await db.commit()
+        doc_row = await write_staged_upload(db, staged, insert_document)
+        document_cache.invalidate()
+        job_queue.wake()
         
-        # Get the inserted document
-        doc_cursor = await db.execute(
-            "SELECT * FROM documents WHERE id = ?", 
-            (cursor.lastrowid,)
-        )
-        doc_row = await doc_cursor.fetchone()
+        # Duplicate content: the incoming copy is not needed
+        await staged.discard()
         
         if not doc_row:
             raise HTTPException(status_code=500, detail="Failed to retrieve uploaded document")
         
         return {
             "message": "Document uploaded successfully",
-            "document": {
-                "id": doc_row["id"],
-                "filename": doc_row["original_name"],
-                "filesize": doc_row["filesize"],
-                "created_at": doc_row["created_at"]
-            }
+            "document": uploaded_document_entry(doc_row)
         }
         
     except HTTPException:
@@ -182,34 +1472,496 @@ async def upload_document(
     except Exception as e:
         print(f"Upload error: {e}")
         # Clean up file if it was created
-        if 'file_path' in locals() and file_path.exists():
-            file_path.unlink()
+        if staged is not None:
+            await staged.discard()
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error during upload"
+        )
+
+@app.post("/api/documents/batch-upload")
+async def batch_upload_documents(
+    documents: List[UploadFile] = File(...),
+    db: DatabasePool = Depends(get_database)
+):
+    """Upload several PDF documents in one request.
+
+    Files are staged to disk concurrently (BATCH_UPLOAD_CONCURRENCY at a
+    time) and every accepted file is recorded in a single transaction.
+    Each file succeeds or fails on its own; the response lists a result
+    per file, in request order.
+    """
+    if len(documents) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_FILES} files per batch"
+        )
+
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def stage(document: UploadFile) -> StagedUpload:
+        async with semaphore:
+            return await stage_upload(document, db)
+
+    outcomes = await asyncio.gather(
+        *(stage(document) for document in documents),
+        return_exceptions=True
+    )
+    staged_uploads = [outcome for outcome in outcomes if isinstance(outcome, StagedUpload)]
+
+    async def insert_batch(conn: aiosqlite.Connection):
+        rows = []
+        for staged in staged_uploads:
+            await conn.execute("SAVEPOINT batch_item")
+            try:
+                rows.append(await insert_staged_upload(conn, staged))
+            except BlobMissingError as e:
+                await conn.execute("ROLLBACK TO batch_item")
+                rows.append(e)
+            await conn.execute("RELEASE batch_item")
+        return rows
+
+    inserted = {}
+    try:
+        if staged_uploads:
+            with upload_stage_seconds.time(stage="db_write"):
+                rows = await db.write(insert_batch)
+            for staged, row in zip(staged_uploads, rows):
+                if isinstance(row, BlobMissingError):
+                    async def insert_document(conn: aiosqlite.Connection, staged=staged):
+                        return await insert_staged_upload(conn, staged)
+
+                    await restage_upload(staged, db)
+                    row = await db.write(insert_document)
+                inserted[id(staged)] = row
+            document_cache.invalidate()
+            job_queue.wake()
+    except Exception as e:
+        print(f"Batch upload error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error during upload"
+        )
+    finally:
+        for staged in staged_uploads:
+            await staged.discard()
+
+    results = []
+    for document, outcome in zip(documents, outcomes):
+        if isinstance(outcome, StagedUpload):
+            results.append({
+                "filename": outcome.original_name,
+                "status": "uploaded",
+                "document": uploaded_document_entry(inserted[id(outcome)])
+            })
+        elif isinstance(outcome, HTTPException):
+            results.append({
+                "filename": document.filename,
+                "status": "error",
+                "detail": outcome.detail
+            })
+        else:
+            print(f"Batch upload error for {document.filename}: {outcome}")
+            results.append({
+                "filename": document.filename,
+                "status": "error",
+                "detail": "Internal server error during upload"
+            })
+
+    uploaded = len(inserted)
+    return {
+        "message": f"{uploaded} of {len(documents)} documents uploaded",
+        "uploaded": uploaded,
+        "failed": len(documents) - uploaded,
+        "results": results
+    }
+
+# Chunk writes in progress per upload session, and the sessions being
+# completed. A session is never in both, so no chunk lands in a part file
+# after it has been hashed and moved into storage.
+session_chunk_writes: Dict[str, int] = {}
+completing_sessions: Set[str] = set()
+
+def session_part_path(upload_id: str) -> Path:
+    """Partial file backing a resumable upload session"""
+    return INCOMING_DIR / f"{upload_id}.session"
+
+def merge_byte_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add [start, end) to a sorted list of disjoint ranges, merging overlaps"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+def missing_byte_ranges(ranges: List[List[int]], file_size: int) -> List[List[int]]:
+    """Complement of the received ranges within [0, file_size)"""
+    missing = []
+    position = 0
+    for range_start, range_end in ranges:
+        if range_start > position:
+            missing.append([position, range_start])
+        position = max(position, range_end)
+    if position < file_size:
+        missing.append([position, file_size])
+    return missing
+
+def upload_session_status(session) -> dict:
+    ranges = json.loads(session["received_ranges"])
+    return {
+        "upload_id": session["id"],
+        "filename": session["original_name"],
+        "filesize": session["filesize"],
+        "received_bytes": sum(end - start for start, end in ranges),
+        "received_ranges": ranges,
+        "missing_ranges": missing_byte_ranges(ranges, session["filesize"]),
+        "chunk_size": UPLOAD_SESSION_CHUNK_SIZE
+    }
+
+async def get_upload_session(db: DatabasePool, upload_id: str):
+    async with db.reader() as conn:
+        cursor = await conn.execute(
+            "SELECT * FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        session = await cursor.fetchone()
+    if not session:
+        raise HTTPException(
+            status_code=404,
+            detail="Upload session not found"
+        )
+    return session
+
+async def purge_expired_upload_sessions(db: DatabasePool):
+    """Drop sessions idle for longer than UPLOAD_SESSION_TTL_SECONDS"""
+    cutoff = datetime.fromtimestamp(time.time() - UPLOAD_SESSION_TTL_SECONDS).isoformat()
+
+    async def remove_expired(conn: aiosqlite.Connection):
+        cursor = await conn.execute(
+            "SELECT id FROM upload_sessions WHERE updated_at < ?",
+            (cutoff,)
+        )
+        expired = [row["id"] for row in await cursor.fetchall()]
+        await conn.execute(
+            "DELETE FROM upload_sessions WHERE updated_at < ?",
+            (cutoff,)
+        )
+        return expired
+
+    for upload_id in await db.write(remove_expired):
+        await run_fs(remove_file, session_part_path(upload_id))
+
+async def purge_upload_sessions_periodically():
+    """Purge expired upload sessions at startup and then every
+    UPLOAD_SESSION_PURGE_INTERVAL_SECONDS, so their part files do not pile
+    up on a long-running server
+    """
+    while True:
+        try:
+            await purge_expired_upload_sessions(db_pool)
+        except Exception as e:
+            print(f"Upload session purge error: {e}")
+        await asyncio.sleep(UPLOAD_SESSION_PURGE_INTERVAL_SECONDS)
+
+@app.post("/api/uploads", status_code=201)
+async def create_upload_session(
+    filename: str = Body(...),
+    filesize: int = Body(..., gt=0),
+    db: DatabasePool = Depends(get_database)
+):
+    """Start a resumable upload.
+
+    The client then PUTs chunks to ``/api/uploads/{upload_id}?offset=N``
+    (in any order, possibly in parallel), can GET the session to learn
+    which byte ranges are still missing after a failure, and POSTs to
+    ``/api/uploads/{upload_id}/complete`` once everything is sent.
+    """
+    if not filename.lower().endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Only PDF files are allowed"
+        )
+    if filesize > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail="File size exceeds 10MB limit"
+        )
+
+    upload_id = secrets.token_hex(16)
+    part_path = session_part_path(upload_id)
+    # Sized up front so chunks can be written at any offset
+    async with aiofiles.open(part_path, 'wb', executor=fs_executor) as f:
+        await f.truncate(filesize)
+
+    now = datetime.now().isoformat()
+
+    async def insert_session(conn: aiosqlite.Connection):
+        await conn.execute("""
+            INSERT INTO upload_sessions (id, original_name, filesize, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (upload_id, filename, filesize, now, now))
+        cursor = await conn.execute(
+            "SELECT * FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        return await cursor.fetchone()
+
+    try:
+        session = await db.write(insert_session)
+    except Exception as e:
+        print(f"Create upload session error: {e}")
+        await run_fs(remove_file, part_path)
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+    return upload_session_status(session)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_session_status(
+    upload_id: str,
+    db: DatabasePool = Depends(get_database)
+):
+    """Report received and missing byte ranges of a resumable upload"""
+    return upload_session_status(await get_upload_session(db, upload_id))
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: DatabasePool = Depends(get_database)
+):
+    """Write the raw request body into the session file at ``offset``"""
+    if upload_id in completing_sessions:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is being completed"
+        )
+    session_chunk_writes[upload_id] = session_chunk_writes.get(upload_id, 0) + 1
+    try:
+        return await write_session_chunk(db, upload_id, request, offset)
+    finally:
+        session_chunk_writes[upload_id] -= 1
+        if not session_chunk_writes[upload_id]:
+            del session_chunk_writes[upload_id]
+
+async def write_session_chunk(db: DatabasePool, upload_id: str, request: Request, offset: int) -> dict:
+    session = await get_upload_session(db, upload_id)
+    file_size = session["filesize"]
+
+    declared_length = request.headers.get("content-length")
+    if declared_length is not None:
+        if not declared_length.isdigit():
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid Content-Length header"
+            )
+        if offset + int(declared_length) > file_size:
+            raise HTTPException(
+                status_code=400,
+                detail="Chunk extends past the declared file size"
+            )
+
+    part_path = session_part_path(upload_id)
+    written = 0
+    try:
+        async with aiofiles.open(part_path, 'r+b', executor=fs_executor) as f:
+            await f.seek(offset)
+            async for chunk in request.stream():
+                if offset + written + len(chunk) > file_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Chunk extends past the declared file size"
+                    )
+                await f.write(chunk)
+                written += len(chunk)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail="Upload session not found"
+        )
+
+    if written == 0:
+        return upload_session_status(session)
+
+    async def record_chunk(conn: aiosqlite.Connection):
+        cursor = await conn.execute(
+            "SELECT received_ranges FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            raise HTTPException(
+                status_code=404,
+                detail="Upload session not found"
+            )
+        ranges = merge_byte_ranges(json.loads(row["received_ranges"]), offset, offset + written)
+        await conn.execute("""
+            UPDATE upload_sessions SET received_ranges = ?, updated_at = ?
+            WHERE id = ?
+        """, (json.dumps(ranges), datetime.now().isoformat(), upload_id))
+        cursor = await conn.execute(
+            "SELECT * FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        return await cursor.fetchone()
+
+    return upload_session_status(await db.write(record_chunk))
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload_session(
+    upload_id: str,
+    db: DatabasePool = Depends(get_database)
+):
+    """Turn a fully received upload session into a document"""
+    if session_chunk_writes.get(upload_id):
+        raise HTTPException(
+            status_code=409,
+            detail="A chunk of this upload is still being written"
+        )
+    if upload_id in completing_sessions:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is being completed"
+        )
+    completing_sessions.add(upload_id)
+    try:
+        return await complete_session(db, upload_id)
+    finally:
+        completing_sessions.discard(upload_id)
+
+async def complete_session(db: DatabasePool, upload_id: str) -> dict:
+    session = await get_upload_session(db, upload_id)
+    status = upload_session_status(session)
+    if status["missing_ranges"]:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is incomplete"
+        )
+
+    part_path = session_part_path(upload_id)
+    try:
+        fd = await run_fs(os.open, part_path, os.O_RDONLY)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail="Upload session not found"
+        )
+    try:
+        file_size, content_hash = await run_fs(_probe_spooled_upload, fd)
+    finally:
+        os.close(fd)
+
+    staged = StagedUpload(session["original_name"], part_path, file_size, content_hash)
+
+    async def insert_document(conn: aiosqlite.Connection):
+        cursor = await conn.execute(
+            "DELETE FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        if cursor.rowcount == 0:
+            raise HTTPException(
+                status_code=404,
+                detail="Upload session not found"
+            )
+        return await insert_staged_upload(conn, staged)
+
+    try:
+        await publish_staged_upload(staged, db)
+        doc_row = await write_staged_upload(db, staged, insert_document)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Complete upload error: {e}")
         raise HTTPException(
             status_code=500,
             detail="Internal server error during upload"
         )
+    finally:
+        # The session file stays for a retry; only discarded on success
+        staged.release_published()
+    document_cache.invalidate()
+    job_queue.wake()
+
+    # Duplicate content: the session file is not needed
+    await staged.discard()
+
+    return {
+        "message": "Document uploaded successfully",
+        "document": uploaded_document_entry(doc_row)
+    }
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload_session(
+    upload_id: str,
+    db: DatabasePool = Depends(get_database)
+):
+    """Abandon a resumable upload and discard what was received"""
+    async def remove_session(conn: aiosqlite.Connection):
+        cursor = await conn.execute(
+            "DELETE FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        return cursor.rowcount
+
+    if not await db.write(remove_session):
+        raise HTTPException(
+            status_code=404,
+            detail="Upload session not found"
+        )
+
+    await run_fs(remove_file, session_part_path(upload_id))
+    return {"message": "Upload session aborted"}
 
 @app.get("/api/documents")
-async def get_documents(db: aiosqlite.Connection = Depends(get_database)):
-    """Get all documents metadata"""
+async def get_documents(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+):
+    """Get documents metadata, newest first.
+
+    Without ``limit`` every matching document is streamed back in batches.
+    With ``limit`` the response holds one page plus a ``next_cursor`` to
+    pass back as ``cursor`` for the following page (keyset pagination on
+    ``(created_at, id)``).
+    """
+    filters = DocumentFilters(name_prefix, min_size, max_size, created_after, created_before)
+    after = decode_cursor(cursor) if cursor is not None else None
+
+    if limit is None:
+        return StreamingResponse(
+            stream_documents_json(filters, after),
+            media_type="application/json"
+        )
+
+    cache_key = (limit, cursor, name_prefix, min_size, max_size, created_after, created_before)
+    listing = document_cache.get_listing(cache_key)
+    if listing is not None:
+        return listing
+
     try:
-        cursor = await db.execute("""
-            SELECT id, original_name as filename, filesize, created_at
-            FROM documents
-            ORDER BY created_at DESC
-        """)
-        rows = await cursor.fetchall()
+        version = document_cache.version
+        # Fetch one extra row to learn whether another page exists
+        rows = await document_repository.list_page(filters, after, limit + 1)
         
-        documents = []
-        for row in rows:
-            documents.append({
-                "id": row["id"],
-                "filename": row["filename"],
-                "filesize": row["filesize"],
-                "created_at": row["created_at"]
-            })
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
         
-        return {"documents": documents}
+        documents = [document_listing_entry(row) for row in rows]
+        
+        listing = {"documents": documents, "next_cursor": next_cursor}
+        document_cache.put_listing(cache_key, listing, version)
+        return listing
         
     except Exception as e:
         print(f"Get documents error: {e}")
@@ -218,37 +1970,149 @@ async def get_documents(db: aiosqlite.Connection = Depends(get_database)):
             detail="Internal server error"
         )
 
+def build_search_query(text: str) -> Optional[str]:
+    """FTS5 query matching every word of ``text``, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators in user input match literally.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+@app.get("/api/documents/search")
+async def search_documents(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """Search document names and contents, best matches first.
+
+    Each hit carries a snippet of the matching text with matched words
+    marked by SEARCH_HIGHLIGHT. Documents are searchable once their
+    index_document_text job has run, shortly after upload.
+    """
+    match = build_search_query(q)
+    if match is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Search query must contain a word"
+        )
+
+    try:
+        # Fetch one extra row to learn whether another page exists
+        hits = await document_repository.search(
+            match,
+            SEARCH_HIGHLIGHT,
+            SEARCH_SNIPPET_TOKENS,
+            SEARCH_NAME_WEIGHT,
+            limit + 1,
+            offset
+        )
+    except Exception as e:
+        print(f"Search error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+    results = []
+    for hit in hits[:limit]:
+        results.append({
+            "id": hit.id,
+            "filename": hit.filename,
+            "filesize": hit.filesize,
+            "created_at": hit.created_at,
+            "snippet": hit.snippet,
+            # bm25 scores are negative, lower is better
+            "score": -hit.score
+        })
+
+    return {
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(hits) > limit
+    }
+
 @app.get("/api/documents/{document_id}")
 async def download_document(
     document_id: int,
-    db: aiosqlite.Connection = Depends(get_database)
+    request: Request
 ):
-    """Download a specific document"""
+    """Download a specific document.
+
+    Supports conditional requests (If-None-Match / If-Modified-Since) and
+    single or multiple byte ranges, honouring If-Range.
+    """
     try:
-        cursor = await db.execute(
-            "SELECT * FROM documents WHERE id = ?", 
-            (document_id,)
-        )
-        doc_row = await cursor.fetchone()
+        document = await get_document(document_id)
         
-        if not doc_row:
+        if not document:
             raise HTTPException(
                 status_code=404,
                 detail="Document not found"
             )
         
-        file_path = Path(doc_row["filepath"])
+        key = document.filepath
+        disposition = content_disposition(document.original_name)
+        
+        # Backends that can serve the bytes themselves get a redirect
+        redirect_url = storage.presigned_url(key, disposition)
+        if redirect_url:
+            return RedirectResponse(redirect_url, status_code=307)
         
-        if not file_path.exists():
+        stored = await storage.stat(key)
+        if stored is None:
             raise HTTPException(
                 status_code=404,
                 detail="File not found on disk"
             )
         
-        return FileResponse(
-            path=file_path,
+        etag = document_etag(document, stored)
+        headers = {
+            "etag": etag,
+            "last-modified": formatdate(stored.mtime, usegmt=True),
+            "cache-control": DOWNLOAD_CACHE_CONTROL,
+            "accept-ranges": "bytes"
+        }
+        
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+        elif if_modified_since is not None:
+            if not_modified_since(if_modified_since, stored.mtime):
+                return Response(status_code=304, headers=headers)
+        
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and if_range is not None:
+            # Only serve a partial body if the client's copy is current
+            if if_range.startswith('"') or if_range.startswith("W/"):
+                range_applies = not etag.startswith("W/") and if_range.strip() == etag
+            else:
+                range_applies = if_range.strip() == headers["last-modified"]
+            if not range_applies:
+                range_header = None
+        
+        headers["content-disposition"] = disposition
+        if range_header:
+            ranges = parse_range_header(range_header, stored.size)
+            if ranges == []:
+                return Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{stored.size}"}
+                )
+            if ranges:
+                return range_response(key, ranges, stored.size, headers)
+        
+        headers["content-length"] = str(stored.size)
+        return StreamingResponse(
+            storage.get_stream(key),
             media_type="application/pdf",
-            filename=doc_row["original_name"]
+            headers=headers
         )
         
     except HTTPException:
@@ -260,43 +2124,90 @@ async def download_document(
             detail="Internal server error during download"
         )
 
+@app.get("/api/documents/{document_id}/preview")
+async def get_document_preview(
+    document_id: int,
+    request: Request,
+    db: DatabasePool = Depends(get_database)
+):
+    """A small JPEG of the document's first page.
+
+    Previews are rendered in the background after upload. Until one is
+    ready (or after it was evicted from the cache) this returns 404 with
+    Retry-After and queues a render. Content that failed to render, such
+    as an encrypted PDF, gets a plain 404.
+    """
+    document = await get_document(document_id)
+    if not document:
+        raise HTTPException(
+            status_code=404,
+            detail="Document not found"
+        )
+    content_hash = document.content_hash
+    if not content_hash:
+        raise HTTPException(
+            status_code=404,
+            detail="Preview not available"
+        )
+
+    etag = f'"preview-{content_hash}"'
+    headers = {"etag": etag, "cache-control": PREVIEW_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    path = preview_cache.get(content_hash)
+    if path is not None:
+        try:
+            # Previews are a few KB; reading them whole avoids racing eviction
+            image = await run_fs(path.read_bytes)
+            return Response(image, media_type="image/jpeg", headers=headers)
+        except FileNotFoundError:
+            pass
+
+    if content_hash in preview_cache.failed:
+        raise HTTPException(
+            status_code=404,
+            detail="Preview not available"
+        )
+    if content_hash not in preview_cache.pending:
+        preview_cache.pending.add(content_hash)
+
+        async def queue_render(conn: aiosqlite.Connection):
+            await enqueue_job(conn, "render_preview", {"document_id": document_id})
+
+        await db.write(queue_render)
+        job_queue.wake()
+    raise HTTPException(
+        status_code=404,
+        detail="Preview not ready",
+        headers={"Retry-After": str(PREVIEW_RETRY_AFTER_SECONDS)}
+    )
+
 @app.delete("/api/documents/{document_id}")
 async def delete_document(
     document_id: int,
-    db: aiosqlite.Connection = Depends(get_database)
+    db: DatabasePool = Depends(get_database)
 ):
     """Delete a document"""
     try:
-        # Get document info
-        cursor = await db.execute(
-            "SELECT * FROM documents WHERE id = ?", 
-            (document_id,)
-        )
-        doc_row = await cursor.fetchone()
-        
-        if not doc_row:
-            raise HTTPException(
-                status_code=404,
-                detail="Document not found"
-            )
+        async def remove_document(conn: aiosqlite.Connection):
+            document = await document_repository.delete(conn, document_id)
+            
+            if not document:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Document not found"
+                )
+            
+            return await release_blob(conn, document)
         
-        # Delete file from disk
-        file_path = Path(doc_row["filepath"])
-        if file_path.exists():
-            file_path.unlink()
+        released_key = await db.write(remove_document)
+        document_cache.invalidate(document_id)
         
-        # Delete from database
-        delete_cursor = await db.execute(
-            "DELETE FROM documents WHERE id = ?", 
-            (document_id,)
-        )
-        await db.commit()
-        
-        if delete_cursor.rowcount == 0:
-            raise HTTPException(
-                status_code=404,
-                detail="Document not found"
-            )
+        # Delete stored content once its last reference is gone
+        if released_key is not None:
+            await purge_or_queue_blobs(db, [released_key])
         
         return {"message": "Document deleted successfully"}
         
@@ -309,6 +2220,157 @@ async def delete_document(
             detail="Internal server error during deletion"
         )
 
+def unique_ids(ids: List[int], limit: int) -> List[int]:
+    """Deduplicate requested ids, keeping order, and enforce ``limit``"""
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {limit} documents per request"
+        )
+    return ids
+
+@app.post("/api/documents/bulk-delete")
+async def bulk_delete_documents(
+    ids: List[int] = Body(..., embed=True),
+    db: DatabasePool = Depends(get_database)
+):
+    """Delete many documents in one transaction.
+
+    Stored content whose last reference is removed is purged once the
+    transaction commits, or by a purge_blobs job if that fails.
+    """
+    ids = unique_ids(ids, MAX_BULK_DELETE_IDS)
+
+    async def remove_documents(conn: aiosqlite.Connection):
+        deleted = await document_repository.delete_many(conn, ids)
+        removed = [document.id for document in deleted]
+        released_keys = []
+        for document in deleted:
+            key = await release_blob(conn, document)
+            if key is not None:
+                released_keys.append(key)
+        return removed, released_keys
+
+    try:
+        removed, released_keys = await db.write(remove_documents)
+        for document_id in removed:
+            document_cache.invalidate(document_id)
+        await purge_or_queue_blobs(db, released_keys)
+    except Exception as e:
+        print(f"Bulk delete error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error during deletion"
+        )
+
+    removed_ids = set(removed)
+    return {
+        "message": f"{len(removed)} documents deleted",
+        "deleted": [document_id for document_id in ids if document_id in removed_ids],
+        "not_found": [document_id for document_id in ids if document_id not in removed_ids]
+    }
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Unseekable sink for zipfile whose output is drained as it is written.
+
+    Because it cannot seek, zipfile writes each entry's sizes and CRC in a
+    trailing data descriptor instead of patching the local header, which
+    is what lets the archive be streamed.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def zip_entry_name(document: DocumentRecord) -> str:
+    """Archive member name for a document: its id and the last component
+    of its client-supplied name, so no entry can point outside the
+    directory it is extracted into
+    """
+    name = document.original_name.replace("\\", "/").rsplit("/", 1)[-1]
+    name = "".join(char for char in name if char.isprintable()).strip()
+    if name in ("", ".", ".."):
+        name = "document.pdf"
+    return f"{document.id}-{name}"
+
+async def stream_documents_zip(documents: List[DocumentRecord]) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of the given documents' files.
+
+    Entries are stored, not compressed (PDFs barely compress), and are
+    streamed from storage chunk by chunk, so memory stays flat regardless
+    of archive size. Documents missing from storage are skipped.
+    """
+    sink = _ZipStreamBuffer()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for document in documents:
+            try:
+                created = datetime.fromisoformat(document.created_at)
+            except ValueError:
+                created = datetime.now()
+            entry = zipfile.ZipInfo(
+                zip_entry_name(document),
+                date_time=created.timetuple()[:6]
+            )
+            entry.compress_type = zipfile.ZIP_STORED
+            entry.file_size = document.filesize
+
+            # Open the stream before starting the entry so a missing object
+            # can be skipped without leaving a truncated member behind
+            chunks = storage.get_stream(document.filepath)
+            try:
+                first_chunk = await chunks.__anext__()
+            except FileNotFoundError:
+                print(f"Bulk download skipped missing file: {document.filepath}")
+                continue
+            except StopAsyncIteration:
+                first_chunk = b""
+
+            with archive.open(entry, mode="w") as member:
+                member.write(first_chunk)
+                yield sink.drain()
+                async for chunk in chunks:
+                    member.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+@app.post("/api/documents/bulk-download")
+async def bulk_download_documents(
+    ids: List[int] = Body(..., embed=True)
+):
+    """Stream the selected documents as a single ZIP archive"""
+    ids = unique_ids(ids, MAX_BULK_DOWNLOAD_IDS)
+
+    documents = await document_repository.get_many(ids)
+
+    if not documents:
+        raise HTTPException(
+            status_code=404,
+            detail="Document not found"
+        )
+
+    # Keep the archive in the order the ids were requested
+    position = {document_id: index for index, document_id in enumerate(ids)}
+    documents.sort(key=lambda document: position[document.id])
+
+    return StreamingResponse(
+        stream_documents_zip(documents),
+        media_type="application/zip",
+        headers={"content-disposition": 'attachment; filename="documents.zip"'}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=3001)
\ No newline at end of file
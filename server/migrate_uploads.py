@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+from pathlib import Path, PureWindowsPath
+from typing import List
+
+import aiosqlite
+
+# Allow running as `python server/migrate_uploads.py` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.main import DATABASE_PATH, UPLOAD_CHUNK_SIZE, init_database, lock_upload_dir, storage
+from server.storage import LocalStorage
+
+BATCH_SIZE = 500  # Stored files moved per transaction
+
+def hash_file(path: Path) -> str:
+    """SHA-256 of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def resolve_stored_path(filepath: str) -> Path:
+    """Find a stored file, including paths recorded by a Windows host"""
+    path = Path(filepath)
+    if not path.exists() and "\\" in filepath:
+        path = Path(*PureWindowsPath(filepath).parts)
+    return path
+
+async def migrate_uploads(dry_run: bool = False):
+    """Move stored files into the sharded content-addressed layout.
+
+    Each distinct ``filepath`` in ``documents`` is hard-linked to
+    ``storage.key_for(content_hash)`` (hashing files stored before content
+    hashing existed), its rows are repointed, and the old name is only
+    unlinked after the batch commits, so an interrupted run never leaves a
+    row pointing at a missing file. ``blobs`` is then rebuilt from the
+    documents that reference each hash.
+
+    The server must be stopped: it caches document rows, so it would keep
+    serving the old paths. Refuses to run while one holds the upload
+    directory lock.
+    """
+    if not isinstance(storage, LocalStorage):
+        print("❌ migrate_uploads only applies to local storage backends")
+        return
+
+    try:
+        lock_fd = lock_upload_dir(exclusive=True)
+    except BlockingIOError:
+        print("❌ The server is running; stop it before migrating uploads")
+        return
+    try:
+        await move_stored_files(dry_run)
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
+
+async def move_stored_files(dry_run: bool):
+    await init_database()
+
+    moved = 0
+    missing = 0
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+            SELECT filepath, MAX(content_hash) AS content_hash
+            FROM documents
+            GROUP BY filepath
+        """)
+        stored = await cursor.fetchall()
+
+        to_unlink: List[Path] = []
+        for index, row in enumerate(stored, start=1):
+            old_path = resolve_stored_path(row["filepath"])
+            content_hash = row["content_hash"]
+
+            if not old_path.exists():
+                print(f"⚠️  Missing on disk, left as is: {old_path}")
+                missing += 1
+                continue
+            if content_hash is None:
+                content_hash = hash_file(old_path)
+
+            new_path = Path(storage.key_for(content_hash))
+            if new_path == old_path:
+                continue
+
+            print(f"{old_path} -> {new_path}")
+            moved += 1
+            if dry_run:
+                continue
+
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            if not new_path.exists():
+                os.link(old_path, new_path)
+            to_unlink.append(old_path)
+            await db.execute("""
+                UPDATE documents
+                SET filepath = ?, filename = ?, content_hash = ?
+                WHERE filepath = ?
+            """, (str(new_path), new_path.name, content_hash, row["filepath"]))
+
+            if index % BATCH_SIZE == 0:
+                await db.commit()
+                for path in to_unlink:
+                    path.unlink()
+                to_unlink.clear()
+
+        if not dry_run:
+            await db.commit()
+            for path in to_unlink:
+                path.unlink()
+
+            # Rebuild blob reference counts from the migrated documents
+            await db.execute("""
+                INSERT INTO blobs (content_hash, filepath, filesize, refcount)
+                SELECT content_hash, MAX(filepath), MAX(filesize), COUNT(*)
+                FROM documents
+                WHERE content_hash IS NOT NULL
+                GROUP BY content_hash
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    filepath = excluded.filepath,
+                    filesize = excluded.filesize,
+                    refcount = excluded.refcount
+            """)
+            await db.execute("""
+                DELETE FROM blobs
+                WHERE content_hash NOT IN (
+                    SELECT content_hash FROM documents WHERE content_hash IS NOT NULL
+                )
+            """)
+            await db.commit()
+
+    action = "Would move" if dry_run else "Moved"
+    print(f"✅ {action} {moved} stored files ({missing} missing on disk)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move uploaded files into the sharded content-addressed layout"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="List the moves without changing anything"
+    )
+    args = parser.parse_args()
+    asyncio.run(migrate_uploads(dry_run=args.dry_run))
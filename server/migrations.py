@@ -0,0 +1,231 @@
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from server.jobs import JOBS_DDL, JOBS_INDEX_DDL, enqueue_job
+
+MIGRATION_STEP_JOB = "migration_step"
+MIGRATION_BATCH_SIZE = 1000  # Rows handled per write op by online steps
+# Tables with more rows than this get new indexes built after startup,
+# in the background, instead of while the server waits to start
+ONLINE_INDEX_MIN_ROWS = 50000
+
+# Indexes by name: the table they cover and their DDL
+INDEXES: Dict[str, Tuple[str, str]] = {
+    # Keyset pagination walks (created_at, id) newest first; the next two
+    # back the listing filters
+    "idx_documents_created_at_id": ("documents", """
+        CREATE INDEX IF NOT EXISTS idx_documents_created_at_id
+        ON documents (created_at DESC, id DESC)
+    """),
+    "idx_documents_original_name": ("documents", """
+        CREATE INDEX IF NOT EXISTS idx_documents_original_name
+        ON documents (original_name COLLATE NOCASE)
+    """),
+    "idx_documents_filesize": ("documents", """
+        CREATE INDEX IF NOT EXISTS idx_documents_filesize
+        ON documents (filesize)
+    """),
+    # Lets text indexing reuse the text of identical content
+    "idx_documents_content_hash": ("documents", """
+        CREATE INDEX IF NOT EXISTS idx_documents_content_hash
+        ON documents (content_hash)
+    """),
+}
+
+async def table_size(conn: aiosqlite.Connection, table: str) -> int:
+    """Approximate row count, read from the rowid b-tree without a scan"""
+    cursor = await conn.execute(f"SELECT MAX(rowid) FROM {table}")
+    row = await cursor.fetchone()
+    return row[0] or 0
+
+async def schedule_step(conn: aiosqlite.Connection, step: str, state: dict):
+    """Queue an online step; it runs once the server is up (see run_step)"""
+    await enqueue_job(conn, MIGRATION_STEP_JOB, {"step": step, **state})
+
+async def create_index(conn: aiosqlite.Connection, name: str):
+    """Create an index now, or schedule it if its table is large"""
+    table, ddl = INDEXES[name]
+    if await table_size(conn, table) > ONLINE_INDEX_MIN_ROWS:
+        await schedule_step(conn, "create_index", {"index": name})
+    else:
+        await conn.execute(ddl)
+
+# Migrations. Each runs once, in a transaction that also records its
+# version, before the server accepts requests, so keep them to fast DDL:
+# use create_index for indexes and schedule_step for work that touches
+# every row. Later changes go in a new function appended to MIGRATIONS;
+# existing ones must not change. Databases from before versioning start
+# at version 0 in any intermediate state, hence IF NOT EXISTS throughout.
+
+async def create_documents(conn: aiosqlite.Connection):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_name TEXT NOT NULL,
+            filepath TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            created_at DATETIME NOT NULL,
+            content_hash TEXT
+        )
+    """)
+    # Databases created before content hashing lack the column; their
+    # rows keep a NULL hash and fall back to stat-based ETags
+    cursor = await conn.execute("PRAGMA table_info(documents)")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if "content_hash" not in columns:
+        await conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+    # Stored files are content-addressed: one file per distinct SHA-256,
+    # shared by every document with that content
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash TEXT PRIMARY KEY,
+            filepath TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            refcount INTEGER NOT NULL
+        )
+    """)
+
+async def create_upload_sessions(conn: aiosqlite.Connection):
+    # Resumable upload sessions; received_ranges is a JSON list of
+    # merged [start, end) byte ranges already written to the part file
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            original_name TEXT NOT NULL,
+            filesize INTEGER NOT NULL,
+            received_ranges TEXT NOT NULL DEFAULT '[]',
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    """)
+
+async def create_jobs(conn: aiosqlite.Connection):
+    # Background job state (see server/jobs.py); online steps of later
+    # migrations are queued here
+    await conn.execute(JOBS_DDL)
+    await conn.execute(JOBS_INDEX_DDL)
+
+async def create_listing_indexes(conn: aiosqlite.Connection):
+    await create_index(conn, "idx_documents_created_at_id")
+    await create_index(conn, "idx_documents_original_name")
+    await create_index(conn, "idx_documents_filesize")
+
+async def create_search_index(conn: aiosqlite.Connection):
+    # Full-text index of document names and extracted PDF text; rowid is
+    # the document id. Rows are added by the index_document_text job and
+    # removed with their document by the trigger.
+    cursor = await conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'")
+    fts_exists = await cursor.fetchone() is not None
+    await conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+        USING fts5(original_name, body, tokenize = 'porter unicode61')
+    """)
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS documents_fts_delete
+        AFTER DELETE ON documents BEGIN
+            DELETE FROM documents_fts WHERE rowid = old.id;
+        END
+    """)
+    await create_index(conn, "idx_documents_content_hash")
+    if not fts_exists and await table_size(conn, "documents"):
+        # Index documents uploaded before search existed
+        await schedule_step(conn, "queue_text_indexing", {"after": 0})
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+# Version N is MIGRATIONS[N - 1]
+MIGRATIONS: List[Migration] = [
+    create_documents,
+    create_upload_sessions,
+    create_jobs,
+    create_listing_indexes,
+    create_search_index,
+]
+
+async def schema_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+async def migrate(conn: aiosqlite.Connection) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied.
+
+    ``conn`` must be in autocommit mode (``isolation_level=None``). Each
+    migration takes the write lock and re-reads the version first, so
+    processes starting together apply each migration once.
+    """
+    applied = []
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if await schema_version(conn) >= version:
+            continue
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            if await schema_version(conn) < version:
+                await migration(conn)
+                # PRAGMA arguments cannot be bound
+                await conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            await conn.execute("COMMIT")
+        except BaseException:
+            await conn.execute("ROLLBACK")
+            raise
+    return applied
+
+# Online steps, run by the migration_step job after startup. Each call
+# does one batch inside a write op and returns the state for the next
+# batch, or None when done. The next batch is queued in the same write
+# op, so an interrupted step resumes where it stopped.
+
+async def create_index_step(conn: aiosqlite.Connection, state: dict) -> Optional[dict]:
+    # SQLite builds an index in one sort pass; it cannot be split into
+    # batches, but as a write op it only holds up other writes, not reads
+    await conn.execute(INDEXES[state["index"]][1])
+    return None
+
+async def queue_text_indexing_step(conn: aiosqlite.Connection, state: dict) -> Optional[dict]:
+    now = datetime.now().isoformat()
+    cursor = await conn.execute("""
+        SELECT MAX(id), COUNT(*) FROM (
+            SELECT id FROM documents WHERE id > ? ORDER BY id LIMIT ?
+        )
+    """, (state["after"], MIGRATION_BATCH_SIZE))
+    last_id, count = await cursor.fetchone()
+    if not count:
+        return None
+    await conn.execute("""
+        INSERT INTO jobs (kind, payload, run_after, created_at, updated_at)
+        SELECT 'index_document_text', json_object('document_id', id), ?, ?, ?
+        FROM documents
+        WHERE id > ? AND id <= ?
+    """, (time.time(), now, now, state["after"], last_id))
+    return {"after": last_id} if count == MIGRATION_BATCH_SIZE else None
+
+ONLINE_STEPS: Dict[str, Callable[[aiosqlite.Connection, dict], Awaitable[Optional[dict]]]] = {
+    "create_index": create_index_step,
+    "queue_text_indexing": queue_text_indexing_step,
+}
+
+async def run_step(conn: aiosqlite.Connection, payload: dict) -> bool:
+    """Run one batch of an online step inside a write op.
+
+    Queues the next batch, if any, and returns whether it did; wake the
+    job queue afterwards when it did.
+    """
+    state = dict(payload)
+    step = state.pop("step")
+    next_state = await ONLINE_STEPS[step](conn, state)
+    if next_state is None:
+        return False
+    await schedule_step(conn, step, next_state)
+    return True
+
+async def migrate_database(database_path: str) -> List[int]:
+    """Open the database at ``database_path`` and bring its schema up to date"""
+    async with aiosqlite.connect(database_path, isolation_level=None) as conn:
+        # journal_mode is persistent, so setting it once here covers every
+        # connection opened afterwards
+        await conn.execute("PRAGMA journal_mode = WAL")
+        return await migrate(conn)
@@ -0,0 +1,31 @@
+from typing import List
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Text extraction is optional
+    PdfReader = None
+
+def extract_pdf_text(path: str, max_chars: int) -> str:
+    """Extract up to ``max_chars`` of text from a PDF, page by page.
+
+    CPU-bound; run it in the job queue's process pool. Encrypted PDFs
+    that do not open with an empty password yield no text.
+    """
+    if PdfReader is None:
+        raise RuntimeError("PDF text extraction requires pypdf: pip install pypdf")
+
+    reader = PdfReader(path)
+    if reader.is_encrypted and not reader.decrypt(""):
+        return ""
+
+    parts: List[str] = []
+    remaining = max_chars
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if not text:
+            continue
+        parts.append(text[:remaining])
+        remaining -= len(parts[-1])
+        if remaining <= 0:
+            break
+    return "\n".join(parts)
@@ -0,0 +1,135 @@
+import re
+from typing import Optional
+
+PDF_HEADER_RE = re.compile(rb"%PDF-[12]\.\d")
+PDF_HEADER_LENGTH = 8
+PDF_MAX_TRAILING_BYTES = 1024  # Readers look for %%EOF in the last 1KB
+ZIP_EOCD_WINDOW = 22 + 65535  # ZIP readers look for their directory this close to the end
+
+# One pass over each chunk finds every token the validator tracks. The
+# leading lookahead on the tokens' first bytes lets re skip positions
+# that cannot match instead of trying every alternative at each byte.
+_TOKEN_RE = re.compile(
+    rb"(?=[%sx/oP])(?:"
+    rb"(?P<eof>%%EOF)"
+    rb"|startxref\s+(?P<startxref>\d{1,20})"
+    rb"|(?P<xref>\bxref\b|/Type\s*/XRef\b)"
+    rb"|(?P<page>/Type\s*/Page(?![A-Za-z]))"
+    rb"|(?P<objstm>/Type\s*/ObjStm\b)"
+    rb"|(?P<obj>\bobj\b)"
+    rb"|(?P<zip>PK\x05\x06)"
+    rb")"
+)
+# Longest token a chunk boundary may split; matches starting this close
+# to the end of the scanned data wait for the next chunk
+_TOKEN_TAIL = 64
+
+class PdfValidationError(ValueError):
+    """An upload is not a well-formed PDF"""
+
+class PdfStreamValidator:
+    """Structural PDF checks run incrementally over upload chunks.
+
+    ``feed()`` each chunk in order, then call ``finish()``. Only a small
+    tail of the previous chunk is kept, so memory use does not grow with
+    file size. Checks:
+
+    - the file starts with a ``%PDF-x.y`` header
+    - a cross-reference table or stream and a ``startxref`` pointing
+      inside the file are present
+    - the last ``%%EOF`` is followed by at most PDF_MAX_TRAILING_BYTES;
+      anything longer is data appended to the PDF (a polyglot), and is
+      rejected as soon as it is seen
+    - no ZIP directory sits where a ZIP reader would find it
+    - the document has pages, where that can be counted (pages inside
+      compressed object streams cannot be, without inflating them)
+
+    Failures raise PdfValidationError.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.page_count = 0
+        self._buffer = b""
+        self._buffer_offset = 0
+        self._header_checked = False
+        self._has_xref = False
+        self._has_object_streams = False
+        self._startxref: Optional[int] = None
+        self._last_eof_end: Optional[int] = None
+        self._last_object: Optional[int] = None
+        self._last_zip_directory: Optional[int] = None
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        self._buffer += chunk
+        if not self._header_checked:
+            if len(self._buffer) < PDF_HEADER_LENGTH:
+                return
+            if not PDF_HEADER_RE.match(self._buffer):
+                raise PdfValidationError("missing %PDF header")
+            self._header_checked = True
+
+        self._scan(len(self._buffer) - _TOKEN_TAIL)
+        self._check_trailing_data()
+
+    def finish(self) -> int:
+        """Run the end-of-file checks and return the page count"""
+        if not self._header_checked:
+            raise PdfValidationError("missing %PDF header")
+        self._scan(len(self._buffer))
+
+        if not self._has_xref:
+            raise PdfValidationError("missing cross-reference table")
+        if self._startxref is None or self._startxref >= self.size:
+            raise PdfValidationError("missing or out-of-range startxref")
+        if self._last_eof_end is None:
+            raise PdfValidationError("missing %%EOF trailer")
+        self._check_trailing_data(at_end=True)
+        if (
+            self._last_zip_directory is not None
+            and self._last_zip_directory >= self.size - ZIP_EOCD_WINDOW
+        ):
+            raise PdfValidationError("file is also a ZIP archive")
+        if self.page_count == 0 and not self._has_object_streams:
+            raise PdfValidationError("document has no pages")
+        return self.page_count
+
+    def _scan(self, limit: int):
+        """Record tokens starting before ``limit`` in the buffer, then drop them"""
+        if limit <= 0:
+            return
+        for match in _TOKEN_RE.finditer(self._buffer):
+            if match.start() >= limit:
+                break
+            kind = match.lastgroup
+            position = self._buffer_offset + match.start()
+            if kind == "eof":
+                self._last_eof_end = self._buffer_offset + match.end()
+            elif kind == "startxref":
+                self._startxref = int(match.group("startxref"))
+            elif kind == "xref":
+                self._has_xref = True
+                self._last_object = position
+            elif kind == "page":
+                self.page_count += 1
+            elif kind == "objstm":
+                self._has_object_streams = True
+            elif kind == "obj":
+                self._last_object = position
+            elif kind == "zip":
+                self._last_zip_directory = position
+        self._buffer = self._buffer[limit:]
+        self._buffer_offset += limit
+
+    def _check_trailing_data(self, at_end: bool = False):
+        """Reject data after %%EOF that is not an incremental update"""
+        if self._last_eof_end is None:
+            return
+        if self._last_object is not None and self._last_object > self._last_eof_end:
+            # An incremental update follows; it must end with its own %%EOF
+            if not at_end:
+                return
+            raise PdfValidationError("incremental update is missing its %%EOF trailer")
+        if self.size - self._last_eof_end > PDF_MAX_TRAILING_BYTES:
+            raise PdfValidationError("unexpected data after %%EOF")
@@ -0,0 +1,151 @@
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from server.storage import remove_file, run_fs
+
+try:
+    import pypdfium2
+    from PIL import Image
+except ImportError:  # Preview rendering is optional
+    pypdfium2 = None
+    Image = None
+
+# pdfium is not thread-safe. Each job process renders one page at a time
+# anyway; this only matters when jobs run on threads instead.
+_pdfium_lock = threading.Lock()
+
+def render_first_page(pdf_path: str, out_path: str, max_dimension: int, quality: int):
+    """Render a PDF's first page to a JPEG no larger than ``max_dimension``.
+
+    CPU-bound; run it in the job queue's process pool.
+    """
+    if pypdfium2 is None:
+        raise RuntimeError("PDF previews require pypdfium2 and Pillow: pip install pypdfium2 Pillow")
+
+    with _pdfium_lock:
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            # Render straight at thumbnail resolution rather than scaling down
+            scale = max_dimension / max(width, height, 1)
+            image = page.render(scale=scale).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    image.convert("RGB").save(out_path, "JPEG", quality=quality, optimize=True)
+
+class PreviewCache:
+    """First-page preview images on disk, keyed by content hash.
+
+    Bounded to ``max_bytes``: adding a preview evicts the least recently
+    served ones. Recency is tracked in memory and seeded from file
+    modification times by ``load()``; only file operations leave the
+    event loop thread. ``pending`` holds hashes with a render job queued,
+    so repeated misses queue one job; ``failed`` the most recent
+    ``max_failed`` hashes whose render ran out of attempts, so they are
+    not queued again.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, max_failed: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_failed = max_failed
+        self.total_bytes = 0
+        self.pending = set()
+        self.failed: "OrderedDict[str, None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._entries
+
+    def path_for(self, content_hash: str) -> Path:
+        return self.directory / f"{content_hash}.jpg"
+
+    def load(self):
+        """Index previews already on disk, oldest first. Blocking."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".jpg"):
+                stat_result = entry.stat()
+                found.append((stat_result.st_mtime, entry.name[:-4], stat_result.st_size))
+            elif entry.name.endswith(".tmp"):
+                os.unlink(entry.path)
+        self._entries.clear()
+        self.total_bytes = 0
+        for _, content_hash, size in sorted(found):
+            self._entries[content_hash] = size
+            self.total_bytes += size
+        for path in self._evict():
+            remove_file(path)
+
+    def get(self, content_hash: str) -> Optional[Path]:
+        """Path of a cached preview, marking it recently used"""
+        if content_hash not in self._entries:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(content_hash)
+        self.hits += 1
+        return self.path_for(content_hash)
+
+    def temp_path(self, content_hash: str) -> Path:
+        """Where to render a preview before ``add()`` moves it into place"""
+        return self.directory / f"{content_hash}.{secrets.token_hex(8)}.tmp"
+
+    async def add(self, content_hash: str, rendered: Path):
+        """Move a rendered preview into the cache, then evict"""
+        size = (await run_fs(rendered.stat)).st_size
+        await run_fs(os.replace, rendered, self.path_for(content_hash))
+        self.total_bytes += size - self._entries.pop(content_hash, 0)
+        self._entries[content_hash] = size
+        self.pending.discard(content_hash)
+        self.failed.pop(content_hash, None)
+        for path in self._evict():
+            await run_fs(remove_file, path)
+
+    def render_failed(self, content_hash: str):
+        """Record that a preview cannot be rendered"""
+        self.pending.discard(content_hash)
+        self.failed[content_hash] = None
+        self.failed.move_to_end(content_hash)
+        while len(self.failed) > self.max_failed:
+            self.failed.popitem(last=False)
+
+    async def discard(self, content_hash: str):
+        """Drop the preview of content that was deleted"""
+        size = self._entries.pop(content_hash, None)
+        if size is not None:
+            self.total_bytes -= size
+        await run_fs(remove_file, self.path_for(content_hash))
+
+    def _evict(self) -> List[Path]:
+        """Drop entries until under max_bytes; returns files to unlink"""
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            content_hash, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append(self.path_for(content_hash))
+        return evicted
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pending": len(self.pending),
+            "failed": len(self.failed)
+        }
@@ -1,7 +1,12 @@
 import asyncio
-import aiosqlite
+import sys
 from pathlib import Path
 
+# Allow running as `python server/setup.py` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server.migrations import migrate_database
+
 DATABASE_PATH = "server/medical_documents.db"
 UPLOAD_DIR = Path("server/uploads")
 
@@ -14,20 +19,11 @@ async def setup_database():
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
         print("📁 Created uploads directory")
         
-        # Initialize database
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT NOT NULL,
-                    original_name TEXT NOT NULL,
-                    filepath TEXT NOT NULL,
-                    filesize INTEGER NOT NULL,
-                    created_at DATETIME NOT NULL
-                )
-            """)
-            await db.commit()
-            print("📊 Database initialized successfully")
+        # Create or upgrade the database schema
+        applied = await migrate_database(DATABASE_PATH)
+        if applied:
+            print(f"📊 Database migrated to version {applied[-1]}")
+        print("📊 Database initialized successfully")
         
         print("✅ Setup completed successfully!")
         print("")
@@ -0,0 +1,344 @@
+import asyncio
+import functools
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+import aiofiles
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # S3 storage is optional
+    boto3 = None
+    ClientError = None
+
+FS_THREAD_POOL_SIZE = 8  # Worker threads for blocking file-system and storage calls
+STORAGE_CHUNK_SIZE = 64 * 1024  # 64KB read granularity for stored objects
+S3_PART_SIZE = 8 * 1024 * 1024  # Multipart part size; S3 requires at least 5MB
+S3_DELETE_BATCH_SIZE = 1000  # Keys per DeleteObjects request, the S3 maximum
+
+# Blocking calls (stat, unlink, rename, file reads/writes via aiofiles,
+# S3 requests) run on this bounded pool so a slow disk, NFS mount or
+# object store queues work here instead of stalling the event loop.
+fs_executor = ThreadPoolExecutor(
+    max_workers=FS_THREAD_POOL_SIZE,
+    thread_name_prefix="fs"
+)
+
+class FsPoolStats:
+    """Counters for calls made through run_fs"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.calls = 0
+
+    def stats(self) -> dict:
+        return {
+            "workers": FS_THREAD_POOL_SIZE,
+            "in_flight": self.in_flight,
+            "calls": self.calls
+        }
+
+fs_pool_stats = FsPoolStats()
+
+async def run_fs(func: Callable[..., Any], *args) -> Any:
+    """Run a blocking file-system or storage call on fs_executor"""
+    fs_pool_stats.in_flight += 1
+    fs_pool_stats.calls += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            fs_executor, functools.partial(func, *args)
+        )
+    finally:
+        fs_pool_stats.in_flight -= 1
+
+def remove_file(path: Path):
+    """Unlink a file if it exists"""
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+async def iter_local_file(path: Path, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive, or to EOF) of a local file"""
+    remaining = None if end is None else end - start + 1
+    async with aiofiles.open(path, 'rb', executor=fs_executor) as f:
+        if start:
+            await f.seek(start)
+        while remaining is None or remaining > 0:
+            size = STORAGE_CHUNK_SIZE if remaining is None else min(STORAGE_CHUNK_SIZE, remaining)
+            chunk = await f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+class StoredObject:
+    """Size and modification time of a stored object"""
+
+    __slots__ = ("size", "mtime")
+
+    def __init__(self, size: int, mtime: float):
+        self.size = size
+        self.mtime = mtime
+
+class StorageBackend:
+    """Where document content lives, addressed by string keys.
+
+    Keys are what ``documents.filepath`` and ``blobs.filepath`` record.
+    ``get_stream`` raises FileNotFoundError for a missing key.
+
+    ``adopts_instantly`` backends move a staged local file into place with
+    a cheap rename, so uploads adopt the file inside the database write
+    that records it; other backends are given the file before that write.
+    """
+
+    adopts_instantly = False
+
+    def key_for(self, content_hash: str) -> str:
+        raise NotImplementedError
+
+    async def put_file(self, key: str, source: Path):
+        """Store a local file under ``key``; ``source`` may be moved away"""
+        await self.put_stream(key, iter_local_file(source))
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]):
+        raise NotImplementedError
+
+    def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the object's bytes start..end (inclusive, or to the end)"""
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_many(self, keys: List[str]):
+        """Delete several objects; keys that do not exist are ignored"""
+        await asyncio.gather(*(self.delete(key) for key in keys))
+
+    def presigned_url(self, key: str, content_disposition: str) -> Optional[str]:
+        """A URL clients can fetch the object from directly, if supported"""
+        return None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """The object's local file, for backends that keep one"""
+        return None
+
+class LocalStorage(StorageBackend):
+    """Files stored flat in one directory; keys are file paths"""
+
+    adopts_instantly = True
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def key_for(self, content_hash: str) -> str:
+        return str(self.root / f"{content_hash}.pdf")
+
+    async def put_file(self, key: str, source: Path):
+        path = Path(key)
+        await run_fs(functools.partial(path.parent.mkdir, parents=True, exist_ok=True))
+        await run_fs(os.replace, source, path)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]):
+        path = Path(key)
+        await run_fs(functools.partial(path.parent.mkdir, parents=True, exist_ok=True))
+        partial = path.with_name(f"{path.name}.{secrets.token_hex(8)}.tmp")
+        try:
+            async with aiofiles.open(partial, 'wb', executor=fs_executor) as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+            await run_fs(os.replace, partial, path)
+        except BaseException:
+            await run_fs(remove_file, partial)
+            raise
+
+    def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        return iter_local_file(Path(key), start, end)
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            stat_result = await run_fs(os.stat, key)
+        except FileNotFoundError:
+            return None
+        return StoredObject(stat_result.st_size, stat_result.st_mtime)
+
+    async def delete(self, key: str):
+        await run_fs(remove_file, Path(key))
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return Path(key)
+
+class ShardedLocalStorage(LocalStorage):
+    """Local files fanned out into hash-prefix directories.
+
+    Files go under ``depth`` levels of directories named by successive
+    hash byte pairs (ab/cd/abcd....pdf), so no directory grows beyond 256
+    entries per level. ``python server/migrate_uploads.py`` moves files
+    stored under older layouts.
+    """
+
+    def __init__(self, root: Path, depth: int):
+        super().__init__(root)
+        self.depth = depth
+
+    def key_for(self, content_hash: str) -> str:
+        shards = [content_hash[i * 2:i * 2 + 2] for i in range(self.depth)]
+        return str(self.root.joinpath(*shards, f"{content_hash}.pdf"))
+
+class S3Storage(StorageBackend):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Requires boto3. Large objects are sent as multipart uploads in
+    S3_PART_SIZE parts. With ``presign_downloads`` the API redirects
+    downloads to short-lived presigned URLs, so file bytes bypass the app
+    process entirely.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        presign_downloads: bool = False,
+        presign_expires: int = 300
+    ):
+        if boto3 is None:
+            raise RuntimeError("S3 storage requires boto3: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.presign_downloads = presign_downloads
+        self.presign_expires = presign_expires
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region_name
+        )
+
+    def key_for(self, content_hash: str) -> str:
+        return f"{self.prefix}{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.pdf"
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]):
+        part = bytearray()
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in chunks:
+                part += chunk
+                if len(part) < S3_PART_SIZE:
+                    continue
+                if upload_id is None:
+                    response = await run_fs(functools.partial(
+                        self.client.create_multipart_upload,
+                        Bucket=self.bucket, Key=key, ContentType="application/pdf"
+                    ))
+                    upload_id = response["UploadId"]
+                parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(part)))
+                part.clear()
+
+            if upload_id is None:
+                # Small enough for a single request
+                await run_fs(functools.partial(
+                    self.client.put_object,
+                    Bucket=self.bucket, Key=key, Body=bytes(part), ContentType="application/pdf"
+                ))
+                return
+
+            if part:
+                parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(part)))
+            await run_fs(functools.partial(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            ))
+        except BaseException:
+            if upload_id is not None:
+                await run_fs(functools.partial(
+                    self.client.abort_multipart_upload,
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                ))
+            raise
+
+    async def _upload_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        response = await run_fs(functools.partial(
+            self.client.upload_part,
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+        ))
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    async def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        request = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            request["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            response = await run_fs(functools.partial(self.client.get_object, **request))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                raise FileNotFoundError(key)
+            raise
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await run_fs(body.read, STORAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            response = await run_fs(functools.partial(
+                self.client.head_object, Bucket=self.bucket, Key=key
+            ))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return StoredObject(response["ContentLength"], response["LastModified"].timestamp())
+
+    async def delete(self, key: str):
+        await run_fs(functools.partial(
+            self.client.delete_object, Bucket=self.bucket, Key=key
+        ))
+
+    async def delete_many(self, keys: List[str]):
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            response = await run_fs(functools.partial(
+                self.client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+            ))
+            errors = response.get("Errors")
+            if errors:
+                raise OSError(
+                    f"Failed to delete {len(errors)} objects, "
+                    f"first {errors[0]['Key']}: {errors[0]['Message']}"
+                )
+
+    def presigned_url(self, key: str, content_disposition: str) -> Optional[str]:
+        if not self.presign_downloads:
+            return None
+        # Signing is local computation; no request is made here
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentDisposition": content_disposition,
+                "ResponseContentType": "application/pdf"
+            },
+            ExpiresIn=self.presign_expires
+        )
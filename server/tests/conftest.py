@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """Run the app against a fresh database and uploads directory.
+
+    Returns an async context manager yielding an HTTP client for the app;
+    the job queue is not started, so tests run job handlers themselves.
+    """
+    httpx = pytest.importorskip("httpx")
+    from server import main
+
+    monkeypatch.chdir(tmp_path)
+    main.INCOMING_DIR.mkdir(parents=True)
+    main.PREVIEW_DIR.mkdir(parents=True)
+    # Process-wide state would otherwise carry over between tests
+    monkeypatch.setattr(main, "document_cache", main.DocumentCache(
+        main.DOCUMENT_CACHE_SIZE, main.LISTING_CACHE_SIZE, main.CACHE_TTL_SECONDS
+    ))
+    monkeypatch.setattr(main, "preview_cache", main.PreviewCache(
+        main.PREVIEW_DIR, main.PREVIEW_CACHE_MAX_BYTES, main.PREVIEW_MAX_FAILED
+    ))
+    main.request_limiter._buckets.clear()
+
+    @asynccontextmanager
+    async def serving():
+        await main.init_database()
+        await main.db_pool.open()
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                yield client
+        finally:
+            await main.db_pool.close()
+
+    return serving
@@ -0,0 +1,19 @@
+import pytest
+
+from server.documents import DocumentRecord
+from server.main import zip_entry_name
+
+def record(original_name: str) -> DocumentRecord:
+    return DocumentRecord(7, "blob.pdf", original_name, "ab/cd/blob.pdf", 10, "2025-01-08T12:00:00", None)
+
+@pytest.mark.parametrize("original_name, entry", [
+    ("scan.pdf", "7-scan.pdf"),
+    ("../../../etc/cron.d/evil.pdf", "7-evil.pdf"),
+    ("/etc/passwd.pdf", "7-passwd.pdf"),
+    ("..\\..\\windows\\evil.pdf", "7-evil.pdf"),
+    ("sub/dir/", "7-document.pdf"),
+    ("..", "7-document.pdf"),
+    ("re\x00port\n.pdf", "7-report.pdf"),
+])
+def test_zip_entry_name_is_a_safe_basename(original_name, entry):
+    assert zip_entry_name(record(original_name)) == entry
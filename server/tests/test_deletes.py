@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import json
+
+from server import main
+from test_pdf_validation import build_pdf
+
+async def upload(client, data: bytes) -> dict:
+    response = await client.post(
+        "/api/documents/upload",
+        files={"document": ("scan.pdf", data, "application/pdf")}
+    )
+    assert response.status_code == 200
+    return response.json()["document"]
+
+async def queued_jobs(kind: str) -> list:
+    async with main.db_pool.reader() as conn:
+        cursor = await conn.execute("SELECT payload FROM jobs WHERE kind = ?", (kind,))
+        return [json.loads(row["payload"]) for row in await cursor.fetchall()]
+
+def test_failed_purge_is_queued_as_a_job(serve, monkeypatch):
+    async def scenario():
+        async with serve() as client:
+            data = build_pdf()
+            document = await upload(client, data)
+            key = main.storage.key_for(hashlib.sha256(data).hexdigest())
+            stored = main.storage.local_path(key)
+            assert stored.exists()
+
+            async def failing_delete_many(keys):
+                raise OSError("storage unavailable")
+
+            with monkeypatch.context() as patch:
+                patch.setattr(main.storage, "delete_many", failing_delete_many)
+                response = await client.delete(f"/api/documents/{document['id']}")
+            assert response.status_code == 200
+            assert (await client.get(f"/api/documents/{document['id']}")).status_code == 404
+            assert stored.exists()
+
+            [payload] = await queued_jobs("purge_blobs")
+            await main.purge_blobs_job(payload)
+            assert not stored.exists()
+            assert not main.purging_blobs
+
+    asyncio.run(scenario())
+
+def test_failed_bulk_purge_is_queued_as_a_job(serve, monkeypatch):
+    async def scenario():
+        async with serve() as client:
+            documents = [await upload(client, build_pdf(pages)) for pages in (1, 2)]
+
+            async def failing_delete_many(keys):
+                raise OSError("storage unavailable")
+
+            with monkeypatch.context() as patch:
+                patch.setattr(main.storage, "delete_many", failing_delete_many)
+                response = await client.post(
+                    "/api/documents/bulk-delete",
+                    json={"ids": [document["id"] for document in documents]}
+                )
+            assert response.status_code == 200
+            assert len(response.json()["deleted"]) == 2
+
+            [payload] = await queued_jobs("purge_blobs")
+            assert len(payload["keys"]) == 2
+            await main.purge_blobs_job(payload)
+            for key in payload["keys"]:
+                assert not await main.storage.exists(key)
+
+    asyncio.run(scenario())
@@ -0,0 +1,165 @@
+import asyncio
+import re
+from email.utils import formatdate
+
+import pytest
+
+from server import main
+from server.main import etag_matches, not_modified_since, parse_range_header, range_response
+from test_pdf_validation import build_pdf
+
+@pytest.mark.parametrize("header, ranges", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=0-", [(0, 999)]),
+    ("bytes=990-2000", [(990, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=0-0,-1", [(0, 0), (999, 999)]),
+    ("Bytes = 0-1 , 5-6", [(0, 1), (5, 6)]),
+    # Ranges past the end are dropped, and if none is left the caller sends 416
+    ("bytes=500-600,1000-1100", [(500, 600)]),
+    ("bytes=1000-", []),
+    ("bytes=-0", []),
+])
+def test_parse_range_header(header, ranges):
+    assert parse_range_header(header, 1000) == ranges
+
+@pytest.mark.parametrize("header", [
+    "items=0-99",
+    "bytes=",
+    "bytes=abc",
+    "bytes=5-2",
+    "bytes=-",
+    "bytes=1-2-3",
+    "bytes=+5-10",
+    "bytes=1_0-20",
+    "bytes=0-1,x",
+    ",".join(["bytes=0-0"] + [f"{n}-{n}" for n in range(1, main.MAX_BYTE_RANGES + 1)]),
+])
+def test_parse_range_header_ignored(header):
+    assert parse_range_header(header, 1000) is None
+
+def test_parse_range_header_max_ranges():
+    header = "bytes=" + ",".join(f"{n}-{n}" for n in range(main.MAX_BYTE_RANGES))
+    assert len(parse_range_header(header, 1000)) == main.MAX_BYTE_RANGES
+
+def test_parse_range_header_empty_file():
+    assert parse_range_header("bytes=0-", 0) == []
+    assert parse_range_header("bytes=-10", 0) == []
+
+@pytest.mark.parametrize("header, etag, matches", [
+    ('"abc"', '"abc"', True),
+    ('"abc"', 'W/"abc"', True),
+    ('W/"abc"', '"abc"', True),
+    ('"x", "abc"', '"abc"', True),
+    ('"x",W/"abc"', 'W/"abc"', True),
+    (" * ", '"abc"', True),
+    ('"abd"', '"abc"', False),
+    ("abc", '"abc"', False),
+    ("", '"abc"', False),
+])
+def test_etag_matches(header, etag, matches):
+    assert etag_matches(header, etag) is matches
+
+def test_not_modified_since():
+    mtime = 1736337600.5  # 2025-01-08 12:00:00.5 UTC
+    assert not_modified_since("Wed, 08 Jan 2025 12:00:00 GMT", mtime)
+    assert not_modified_since("Wed, 08 Jan 2025 12:00:01 GMT", mtime)
+    assert not not_modified_since("Wed, 08 Jan 2025 11:59:59 GMT", mtime)
+    assert not not_modified_since("yesterday", mtime)
+    assert not not_modified_since("", mtime)
+
+class MemoryStorage:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def get_stream(self, key, start=0, end=None):
+        end = len(self.data) - 1 if end is None else end
+        for offset in range(start, end + 1, 7):
+            yield self.data[offset:min(offset + 7, end + 1)]
+
+async def body_of(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+def test_single_range_response(monkeypatch):
+    data = bytes(range(256))
+    monkeypatch.setattr(main, "storage", MemoryStorage(data))
+
+    response = range_response("key", [(10, 19)], len(data), {})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/256"
+    body = asyncio.run(body_of(response))
+    assert body == data[10:20]
+    assert response.headers["content-length"] == str(len(body))
+
+def test_multipart_range_response(monkeypatch):
+    data = bytes(range(256))
+    monkeypatch.setattr(main, "storage", MemoryStorage(data))
+
+    response = range_response("key", [(0, 4), (100, 149), (255, 255)], len(data), {})
+    assert response.status_code == 206
+    boundary = re.fullmatch(
+        r"multipart/byteranges; boundary=(\w+)", response.headers["content-type"]
+    ).group(1)
+    body = asyncio.run(body_of(response))
+    assert response.headers["content-length"] == str(len(body))
+
+    parts = body.split(f"--{boundary}".encode())
+    assert parts[0] == b"" and parts[-1] == b"--\r\n"
+    expected = [((0, 4), data[0:5]), ((100, 149), data[100:150]), ((255, 255), data[255:])]
+    for part, ((start, end), content) in zip(parts[1:-1], expected):
+        head, _, payload = part.partition(b"\r\n\r\n")
+        assert f"Content-Range: bytes {start}-{end}/256".encode() in head
+        assert payload == content + b"\r\n"
+
+async def upload(client, data: bytes) -> int:
+    response = await client.post(
+        "/api/documents/upload",
+        files={"document": ("scan.pdf", data, "application/pdf")}
+    )
+    return response.json()["document"]["id"]
+
+def test_conditional_and_range_requests(serve):
+    data = build_pdf(pages=2)
+
+    async def scenario():
+        async with serve() as client:
+            url = f"/api/documents/{await upload(client, data)}"
+            response = await client.get(url)
+            assert response.status_code == 200
+            assert response.content == data
+            assert response.headers["cache-control"] == "private, no-cache"
+            assert response.headers["accept-ranges"] == "bytes"
+            etag = response.headers["etag"]
+            last_modified = response.headers["last-modified"]
+
+            response = await client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+            response = await client.get(url, headers={"If-Modified-Since": last_modified})
+            assert response.status_code == 304
+            # If-None-Match takes precedence over If-Modified-Since
+            response = await client.get(
+                url, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified}
+            )
+            assert response.status_code == 200
+
+            response = await client.get(url, headers={"Range": "bytes=0-7"})
+            assert response.status_code == 206
+            assert response.content == data[:8]
+            assert response.headers["content-range"] == f"bytes 0-7/{len(data)}"
+
+            response = await client.get(url, headers={"Range": f"bytes={len(data)}-"})
+            assert response.status_code == 416
+            assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+            for if_range in (etag, last_modified):
+                response = await client.get(url, headers={"Range": "bytes=0-7", "If-Range": if_range})
+                assert response.status_code == 206
+            old_date = formatdate(0, usegmt=True)
+            for if_range in ('"stale"', old_date):
+                response = await client.get(url, headers={"Range": "bytes=0-7", "If-Range": if_range})
+                assert response.status_code == 200
+                assert response.content == data
+
+    asyncio.run(scenario())
@@ -0,0 +1,136 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from server import limits, main
+from server.limits import RateLimiter, client_identity
+from test_pdf_validation import build_pdf
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock for server.limits that only moves when told"""
+    now = [1000.0]
+    monkeypatch.setattr(limits, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+def test_rate_limiter_burst_then_refill(clock):
+    limiter = RateLimiter(rate=2.0, burst=3, max_clients=10)
+    assert [limiter.acquire("a") for _ in range(3)] == [None, None, None]
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    assert limiter.limited == 1
+
+    clock[0] += 0.5
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") == pytest.approx(0.5)
+
+    # Refills stop at the burst size
+    clock[0] += 60
+    assert [limiter.acquire("a") for _ in range(3)] == [None, None, None]
+    assert limiter.acquire("a") is not None
+
+def test_rate_limiter_cost(clock):
+    limiter = RateLimiter(rate=1.0, burst=10, max_clients=10)
+    assert limiter.acquire("a", cost=8) is None
+    assert limiter.acquire("a", cost=4) == pytest.approx(2.0)
+    # A refused request spends nothing
+    assert limiter.acquire("a", cost=2) is None
+
+def test_rate_limiter_clients_are_independent(clock):
+    limiter = RateLimiter(rate=1.0, burst=1, max_clients=10)
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") is not None
+    assert limiter.acquire("b") is None
+
+def test_rate_limiter_evicts_least_recently_seen(clock):
+    limiter = RateLimiter(rate=1.0, burst=1, max_clients=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")  # Seen again, so "b" is now the oldest
+    limiter.acquire("c")
+    assert limiter.stats()["clients"] == 2
+    # "a" kept its empty bucket; "b" was evicted and starts full again
+    assert limiter.acquire("a") is not None
+    assert limiter.acquire("b") is None
+
+def scope(headers=(), client=("10.0.0.1", 1234)):
+    return {
+        "type": "http",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": client
+    }
+
+def test_client_identity():
+    keys = frozenset({"secret"})
+    assert client_identity(scope(), keys) == "ip:10.0.0.1"
+    assert client_identity(scope([("x-api-key", "secret")]), keys) == "key:secret"
+    assert client_identity(scope([("authorization", "Bearer secret")]), keys) == "key:secret"
+    assert client_identity(scope([("authorization", "bearer  secret ")]), keys) == "key:secret"
+    # Unknown keys do not get their own bucket
+    assert client_identity(scope([("x-api-key", "invented")]), keys) == "ip:10.0.0.1"
+    assert client_identity(scope([("authorization", "Basic secret")]), keys) == "ip:10.0.0.1"
+    assert client_identity(scope(client=None), keys) == "ip:unknown"
+
+def test_oversized_upload_rejected_from_content_length(serve):
+    async def scenario():
+        async with serve() as client:
+            response = await client.post(
+                "/api/documents/upload",
+                content=b"",
+                headers={
+                    "content-type": "multipart/form-data; boundary=x",
+                    "content-length": str(main.MAX_UPLOAD_REQUEST_BYTES + 1)
+                }
+            )
+            assert response.status_code == 413
+            assert "retry-after" not in response.headers
+
+    asyncio.run(scenario())
+
+def test_oversized_chunked_upload_cut_off(serve):
+    sent = []
+
+    async def body():
+        yield b'--x\r\nContent-Disposition: form-data; name="document"; filename="big.pdf"\r\n'
+        yield b"Content-Type: application/pdf\r\n\r\n%PDF-1.7\n"
+        for _ in range(20):
+            sent.append(MB)
+            yield b"0" * MB
+        yield b"\r\n--x--\r\n"
+
+    async def scenario():
+        async with serve() as client:
+            response = await client.post(
+                "/api/documents/upload",
+                content=body(),
+                headers={"content-type": "multipart/form-data; boundary=x"}
+            )
+            assert response.status_code == 413
+            # Reading stopped once the cap was passed
+            assert sum(sent) <= main.MAX_UPLOAD_REQUEST_BYTES + MB
+
+    asyncio.run(scenario())
+
+def test_oversized_chunk_rejected(serve):
+    async def scenario():
+        async with serve() as client:
+            response = await client.put(
+                "/api/uploads/missing?offset=0",
+                content=b"0" * (main.MAX_FILE_SIZE + 1)
+            )
+            assert response.status_code == 413
+
+    asyncio.run(scenario())
+
+def test_upload_within_limit_accepted(serve):
+    async def scenario():
+        async with serve() as client:
+            response = await client.post(
+                "/api/documents/upload",
+                files={"document": ("scan.pdf", build_pdf(), "application/pdf")}
+            )
+            assert response.status_code == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from server.main import decode_cursor, encode_cursor
+from test_pdf_validation import build_pdf
+
+def encoded(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+@pytest.mark.parametrize("created_at, document_id", [
+    ("2025-01-08T12:00:00", 1),
+    ("2025-01-08T12:00:00.123456", 2 ** 40),
+    ("", 0),
+])
+def test_cursor_round_trip(created_at, document_id):
+    cursor = encode_cursor(created_at, document_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, document_id)
+
+def test_cursor_from_readme():
+    assert decode_cursor("WyIyMDI1LTAxLTA4VDEyOjAwOjAwWiIsIDFd") == ("2025-01-08T12:00:00Z", 1)
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    encoded(b"not json"),
+    encoded(b"\xff\xfe"),
+    encoded(b'["2025-01-08", 1, 2]'),
+    encoded(b'{"a": 1, "b": 2}'),
+    encoded(b'[1, 1]'),
+    encoded(b'["2025-01-08", "1"]'),
+    encoded(b'["2025-01-08", 1.5]'),
+    encoded(b'["2025-01-08", true]'),
+    encoded(b"7"),
+    encoded(b"[" * 5000),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_paginated_listing(serve):
+    async def scenario():
+        async with serve() as client:
+            for pages in range(1, 6):
+                response = await client.post(
+                    "/api/documents/upload",
+                    files={"document": (f"scan-{pages}.pdf", build_pdf(pages), "application/pdf")}
+                )
+                assert response.status_code == 200
+
+            seen = []
+            cursor = None
+            while True:
+                params = {"limit": 2}
+                if cursor is not None:
+                    params["cursor"] = cursor
+                page = (await client.get("/api/documents", params=params)).json()
+                seen += [document["id"] for document in page["documents"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert seen == [5, 4, 3, 2, 1]
+
+            full = (await client.get("/api/documents")).json()["documents"]
+            assert [document["id"] for document in full] == seen
+
+            page = (await client.get("/api/documents", params={"limit": 10, "name_prefix": "SCAN-3"})).json()
+            assert [document["id"] for document in page["documents"]] == [3]
+            assert (await client.get("/api/documents", params={"cursor": "!"})).status_code == 400
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+import pytest
+
+from server import main
+from server.migrate_uploads import migrate_uploads
+
+pytestmark = pytest.mark.skipif(main.fcntl is None, reason="needs flock")
+
+def test_migration_refused_while_a_server_runs(serve, capsys):
+    server_lock = main.lock_upload_dir(exclusive=False)
+    try:
+        asyncio.run(migrate_uploads())
+    finally:
+        os.close(server_lock)
+    assert "stop it before migrating" in capsys.readouterr().out
+    assert not os.path.exists(main.DATABASE_PATH)
+
+    asyncio.run(migrate_uploads())
+    assert "Moved 0 stored files" in capsys.readouterr().out
+
+def test_servers_share_the_lock(serve):
+    first = main.lock_upload_dir(exclusive=False)
+    second = main.lock_upload_dir(exclusive=False)
+    os.close(first)
+    os.close(second)
+
+def test_server_refuses_to_start_during_a_migration(serve):
+    migration_lock = main.lock_upload_dir(exclusive=True)
+    try:
+        with pytest.raises(RuntimeError, match="migrate_uploads"):
+            asyncio.run(main.startup_event())
+    finally:
+        os.close(migration_lock)
@@ -0,0 +1,131 @@
+import io
+import zipfile
+
+import pytest
+
+from server.pdf_validation import (
+    PDF_MAX_TRAILING_BYTES,
+    PdfStreamValidator,
+    PdfValidationError,
+)
+
+def build_pdf(pages: int = 1, padding: bytes = b"", tail: bytes = b"") -> bytes:
+    """A minimal PDF with ``pages`` pages; ``padding`` goes after the header"""
+    kids = " ".join(f"{3 + index} 0 R" for index in range(pages)).encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages),
+    ]
+    objects += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"] * pages
+
+    body = bytearray(b"%PDF-1.7\n" + padding)
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+    xref_offset = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        body += b"%010d 00000 n \n" % offset
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+    return bytes(body) + tail
+
+def validate(data: bytes, chunk_size: int = 64 * 1024) -> int:
+    validator = PdfStreamValidator()
+    for offset in range(0, len(data), chunk_size):
+        validator.feed(data[offset:offset + chunk_size])
+    return validator.finish()
+
+def zip_archive() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("payload.txt", "hidden")
+    return buffer.getvalue()
+
+def test_valid_pdf_page_count():
+    assert validate(build_pdf(pages=1)) == 1
+    assert validate(build_pdf(pages=3)) == 3
+
+def test_binary_padding_is_skipped():
+    # Bytes above 0x7F, like compressed streams, hold no tokens
+    padding = b"%" + bytes(range(0x80, 0x100)) * 64 + b"\n"
+    assert validate(build_pdf(pages=2, padding=padding)) == 2
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 65, 1000])
+def test_tokens_split_across_chunks(chunk_size):
+    assert validate(build_pdf(pages=2), chunk_size) == 2
+
+def test_missing_header():
+    with pytest.raises(PdfValidationError, match="header"):
+        validate(b"%PDX-1.7\n" + build_pdf()[9:])
+
+def test_missing_xref():
+    data = build_pdf().replace(b"xref\n0", b"xxxx\n0")
+    with pytest.raises(PdfValidationError, match="cross-reference"):
+        validate(data)
+
+def test_missing_startxref():
+    data = build_pdf().replace(b"startxref", b"startxxxx")
+    with pytest.raises(PdfValidationError, match="startxref"):
+        validate(data)
+
+def test_out_of_range_startxref():
+    data = build_pdf()
+    position = data.index(b"startxref\n") + len(b"startxref\n")
+    end = data.index(b"\n", position)
+    data = data[:position] + b"99999999" + data[end:]
+    with pytest.raises(PdfValidationError, match="startxref"):
+        validate(data)
+
+def test_missing_eof():
+    with pytest.raises(PdfValidationError, match="EOF"):
+        validate(build_pdf().replace(b"%%EOF", b"%%END"))
+
+def test_no_pages():
+    data = build_pdf().replace(b"/Type /Page ", b"/Type /Leaf ")
+    with pytest.raises(PdfValidationError, match="no pages"):
+        validate(data)
+
+def test_pages_in_object_streams_are_not_counted():
+    data = build_pdf().replace(b"/Type /Page ", b"/Type /ObjStm ")
+    assert validate(data) == 0
+
+def test_short_trailing_data_allowed():
+    # build_pdf already ends with a newline after %%EOF
+    assert validate(build_pdf(tail=b"\n" * (PDF_MAX_TRAILING_BYTES - 1))) == 1
+
+def test_trailing_data_rejected_while_streaming():
+    data = build_pdf(tail=b"x" * (PDF_MAX_TRAILING_BYTES * 4))
+    validator = PdfStreamValidator()
+    with pytest.raises(PdfValidationError, match="after %%EOF"):
+        for offset in range(0, len(data), 512):
+            validator.feed(data[offset:offset + 512])
+
+def test_incremental_update_allowed():
+    original = build_pdf()
+    xref_offset = original.index(b"xref\n")
+    update = (
+        b"3 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>\nendobj\n"
+        b"xref\n0 1\n0000000000 65535 f \n"
+        b"trailer\n<< /Size 4 /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n"
+        % (xref_offset, len(original))
+    )
+    assert validate(original + b"x" * PDF_MAX_TRAILING_BYTES + update) == 2
+
+def test_incremental_update_without_eof_rejected():
+    original = build_pdf()
+    update = b"4 0 obj\n<< >>\nendobj\n" + b"x" * (PDF_MAX_TRAILING_BYTES * 2)
+    with pytest.raises(PdfValidationError, match="incremental update"):
+        validate(original + update)
+
+def test_appended_zip_rejected():
+    archive = zip_archive()
+    assert len(archive) <= PDF_MAX_TRAILING_BYTES
+    with pytest.raises(PdfValidationError, match="ZIP"):
+        validate(build_pdf(tail=archive))
+
+def test_large_appended_zip_rejected():
+    with pytest.raises(PdfValidationError):
+        validate(build_pdf(tail=b"\n" * PDF_MAX_TRAILING_BYTES + zip_archive()))
@@ -0,0 +1,137 @@
+import asyncio
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from server import storage
+from server.storage import S3Storage
+
+BUCKET = "documents"
+PART_SIZE = 5 * 1024 * 1024  # The smallest part S3 accepts
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(storage, "S3_PART_SIZE", PART_SIZE)
+    with moto.mock_aws():
+        backend = S3Storage(BUCKET, prefix="docs/", region_name="us-east-1")
+        backend.client.create_bucket(Bucket=BUCKET)
+        yield backend
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def chunks_of(data: bytes, size: int = storage.STORAGE_CHUNK_SIZE):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+async def read(backend: S3Storage, key: str, start: int = 0, end=None) -> bytes:
+    return b"".join([chunk async for chunk in backend.get_stream(key, start, end)])
+
+def test_key_for_fans_out_by_hash(s3):
+    assert s3.key_for("abcdef" + "0" * 58) == "docs/ab/cd/abcdef" + "0" * 58 + ".pdf"
+
+def test_small_object_is_a_single_put(s3):
+    data = b"%PDF-1.7\n" + os.urandom(1000)
+    run(s3.put_stream("docs/small.pdf", chunks_of(data)))
+
+    head = s3.client.head_object(Bucket=BUCKET, Key="docs/small.pdf")
+    assert "-" not in head["ETag"]
+    assert head["ContentType"] == "application/pdf"
+    assert run(read(s3, "docs/small.pdf")) == data
+
+def test_large_object_is_a_multipart_upload(s3):
+    data = os.urandom(PART_SIZE * 2 + 12345)
+    run(s3.put_stream("docs/large.pdf", chunks_of(data)))
+
+    # Multipart ETags end with the number of parts
+    head = s3.client.head_object(Bucket=BUCKET, Key="docs/large.pdf")
+    assert head["ETag"].strip('"').endswith("-3")
+    assert run(read(s3, "docs/large.pdf")) == data
+
+def test_failed_multipart_upload_is_aborted(s3):
+    async def failing_chunks():
+        yield os.urandom(PART_SIZE)
+        raise OSError("client went away")
+
+    with pytest.raises(OSError):
+        run(s3.put_stream("docs/broken.pdf", failing_chunks()))
+    uploads = s3.client.list_multipart_uploads(Bucket=BUCKET)
+    assert not uploads.get("Uploads")
+    assert run(s3.stat("docs/broken.pdf")) is None
+
+def test_put_file(s3, tmp_path):
+    source = tmp_path / "upload.pdf"
+    source.write_bytes(b"%PDF-1.7\nbody")
+    run(s3.put_file("docs/file.pdf", source))
+    assert run(read(s3, "docs/file.pdf")) == b"%PDF-1.7\nbody"
+
+def test_get_stream_ranges(s3):
+    data = bytes(range(256)) * 1024
+    run(s3.put_stream("docs/ranges.pdf", chunks_of(data)))
+
+    assert run(read(s3, "docs/ranges.pdf", 10, 19)) == data[10:20]
+    assert run(read(s3, "docs/ranges.pdf", 0, 0)) == data[:1]
+    assert run(read(s3, "docs/ranges.pdf", 1000)) == data[1000:]
+    assert run(read(s3, "docs/ranges.pdf", len(data) - 5, len(data) - 1)) == data[-5:]
+
+def test_get_stream_missing_key(s3):
+    with pytest.raises(FileNotFoundError):
+        run(read(s3, "docs/missing.pdf"))
+
+def test_stat(s3):
+    run(s3.put_stream("docs/stat.pdf", chunks_of(b"x" * 4321)))
+
+    stored = run(s3.stat("docs/stat.pdf"))
+    assert stored.size == 4321
+    assert stored.mtime > 0
+    assert run(s3.exists("docs/stat.pdf"))
+    assert run(s3.stat("docs/missing.pdf")) is None
+    assert not run(s3.exists("docs/missing.pdf"))
+
+def test_delete(s3):
+    run(s3.put_stream("docs/delete.pdf", chunks_of(b"x")))
+    run(s3.delete("docs/delete.pdf"))
+    assert run(s3.stat("docs/delete.pdf")) is None
+    # Deleting a missing key is not an error
+    run(s3.delete("docs/delete.pdf"))
+
+def test_delete_many(s3, monkeypatch):
+    monkeypatch.setattr(storage, "S3_DELETE_BATCH_SIZE", 3)
+    keys = [f"docs/many-{index}.pdf" for index in range(7)]
+    for key in keys:
+        run(s3.put_stream(key, chunks_of(b"x")))
+    run(s3.put_stream("docs/kept.pdf", chunks_of(b"x")))
+
+    run(s3.delete_many(keys + ["docs/missing.pdf"]))
+
+    listed = s3.client.list_objects_v2(Bucket=BUCKET)
+    assert [item["Key"] for item in listed["Contents"]] == ["docs/kept.pdf"]
+
+def test_presigned_url_disabled_by_default(s3):
+    assert s3.presigned_url("docs/file.pdf", 'attachment; filename="a.pdf"') is None
+
+def test_presigned_url(s3):
+    s3.presign_downloads = True
+    run(s3.put_stream("docs/signed.pdf", chunks_of(b"%PDF-1.7\nsigned")))
+
+    url = s3.presigned_url("docs/signed.pdf", 'attachment; filename="report.pdf"')
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    assert parsed.path.endswith("/docs/signed.pdf")
+    assert BUCKET in parsed.netloc + parsed.path
+    assert query["response-content-disposition"] == ['attachment; filename="report.pdf"']
+    assert query["response-content-type"] == ["application/pdf"]
+    # boto3 signs with SigV2 or SigV4 depending on its configuration
+    assert "Signature" in query or "X-Amz-Signature" in query
+
+    requests = pytest.importorskip("requests")
+    response = requests.get(url)
+    assert response.status_code == 200
+    assert response.content == b"%PDF-1.7\nsigned"
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from server import main
+from server.main import merge_byte_ranges, missing_byte_ranges
+from test_pdf_validation import build_pdf
+
+@pytest.mark.parametrize("ranges, start, end, merged", [
+    ([], 0, 10, [[0, 10]]),
+    ([[0, 10]], 20, 30, [[0, 10], [20, 30]]),
+    ([[20, 30]], 0, 10, [[0, 10], [20, 30]]),
+    ([[0, 10]], 10, 20, [[0, 20]]),
+    ([[0, 10], [20, 30]], 10, 20, [[0, 30]]),
+    ([[0, 10], [20, 30]], 5, 25, [[0, 30]]),
+    ([[0, 30]], 5, 10, [[0, 30]]),
+    ([[5, 10], [15, 20], [25, 30]], 0, 100, [[0, 100]]),
+])
+def test_merge_byte_ranges(ranges, start, end, merged):
+    assert merge_byte_ranges(ranges, start, end) == merged
+
+def test_merge_byte_ranges_leaves_input_alone():
+    ranges = [[0, 10]]
+    merge_byte_ranges(ranges, 5, 20)
+    assert ranges == [[0, 10]]
+
+@pytest.mark.parametrize("ranges, missing", [
+    ([], [[0, 100]]),
+    ([[0, 100]], []),
+    ([[0, 40]], [[40, 100]]),
+    ([[60, 100]], [[0, 60]]),
+    ([[10, 20], [30, 40]], [[0, 10], [20, 30], [40, 100]]),
+])
+def test_missing_byte_ranges(ranges, missing):
+    assert missing_byte_ranges(ranges, 100) == missing
+
+async def wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+async def create_session(client, data: bytes) -> str:
+    response = await client.post("/api/uploads", json={"filename": "scan.pdf", "filesize": len(data)})
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+def test_complete_refused_while_a_chunk_is_written(serve):
+    data = build_pdf(padding=b"%" + b"0" * (64 * 1024) + b"\n")
+
+    async def scenario():
+        async with serve() as client:
+            upload_id = await create_session(client, data)
+            response = await client.put(f"/api/uploads/{upload_id}?offset=0", content=data)
+            assert response.json()["missing_ranges"] == []
+
+            # A retried chunk still streaming when the client completes
+            release = asyncio.Event()
+
+            async def late_chunk():
+                yield b"XXXXXXXX"
+                await release.wait()
+                yield b"XXXXXXXX"
+
+            late_put = asyncio.create_task(
+                client.put(f"/api/uploads/{upload_id}?offset=100", content=late_chunk())
+            )
+            await wait_until(lambda: upload_id in main.session_chunk_writes)
+
+            response = await client.post(f"/api/uploads/{upload_id}/complete")
+            assert response.status_code == 409
+
+            release.set()
+            assert (await late_put).status_code == 200
+            response = await client.post(f"/api/uploads/{upload_id}/complete")
+            assert response.status_code == 200
+            document = response.json()["document"]
+
+            expected = data[:100] + b"X" * 16 + data[116:]
+            response = await client.get(f"/api/documents/{document['id']}")
+            assert response.content == expected
+            assert response.headers["etag"] == f'"{hashlib.sha256(expected).hexdigest()}"'
+            assert not main.session_chunk_writes
+            assert not main.completing_sessions
+
+    asyncio.run(scenario())
+
+def test_chunk_refused_while_completing(serve):
+    data = build_pdf()
+
+    async def scenario():
+        async with serve() as client:
+            upload_id = await create_session(client, data)
+            await client.put(f"/api/uploads/{upload_id}?offset=0", content=data)
+
+            main.completing_sessions.add(upload_id)
+            try:
+                response = await client.put(f"/api/uploads/{upload_id}?offset=0", content=b"X")
+            finally:
+                main.completing_sessions.discard(upload_id)
+            assert response.status_code == 409
+            assert upload_id not in main.session_chunk_writes
+
+            response = await client.post(f"/api/uploads/{upload_id}/complete")
+            assert response.status_code == 200
+            response = await client.put(f"/api/uploads/{upload_id}?offset=0", content=b"X")
+            assert response.status_code == 404
+
+    asyncio.run(scenario())
+
+def test_malformed_content_length_rejected(serve):
+    async def scenario():
+        async with serve() as client:
+            upload_id = await create_session(client, build_pdf())
+            for declared in ("abc", "-1", "1e3"):
+                # Overrides the length httpx computed from the body
+                request = client.build_request("PUT", f"/api/uploads/{upload_id}?offset=0", content=b"%PDF")
+                request.headers["content-length"] = declared
+                response = await client.send(request)
+                assert response.status_code == 400
+                assert response.json()["detail"] == "Invalid Content-Length header"
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from test_pdf_validation import build_pdf
+
+@pytest.mark.parametrize("filename", ["sub/dir.pdf", "../../evil.pdf", "..\\evil.pdf"])
+def test_upload_names_with_path_separators(serve, filename):
+    async def scenario():
+        async with serve() as client:
+            response = await client.post(
+                "/api/documents/upload",
+                files={"document": (filename, build_pdf(), "application/pdf")}
+            )
+            assert response.status_code == 200
+            assert response.json()["document"]["filename"] == filename
+
+            response = await client.post(
+                "/api/documents/batch-upload",
+                files=[("documents", (filename, build_pdf(pages=2), "application/pdf"))]
+            )
+            assert response.status_code == 200
+            assert response.json()["uploaded"] == 1
+
+    asyncio.run(scenario())
@@ -20,8 +20,12 @@ function App() {
   const [dragActive, setDragActive] = useState(false);
   const [toasts, setToasts] = useState<Toast[]>([]);
   const [deleteConfirm, setDeleteConfirm] = useState<number | null>(null);
+  const [missingPreviews, setMissingPreviews] = useState<Set<number>>(new Set());
+  const [previewRetries, setPreviewRetries] = useState<Record<number, number>>({});
 
   const API_BASE = 'http://localhost:3001/api';
+  // Reloads of a preview that is still being rendered before giving up
+  const MAX_PREVIEW_RETRIES = 10;
 
   useEffect(() => {
     fetchDocuments();
@@ -39,6 +43,32 @@ function App() {
     setToasts(prev => prev.filter(toast => toast.id !== id));
   };
 
+  const handlePreviewError = async (id: number) => {
+    const retries = previewRetries[id] ?? 0;
+    let retryAfter: number | null = null;
+    try {
+      // The image element cannot see why loading failed; ask again to find out
+      const response = await fetch(`${API_BASE}/documents/${id}/preview`);
+      if (response.ok) {
+        retryAfter = 0;
+      } else if (response.headers.has('Retry-After')) {
+        // Still rendering (404 "Preview not ready") or rate limited;
+        // "Preview not available" has no Retry-After and is final
+        retryAfter = Number(response.headers.get('Retry-After')) || 1;
+      }
+    } catch (error) {
+      // Server unreachable: show the placeholder icon
+    }
+
+    if (retryAfter === null || retries >= MAX_PREVIEW_RETRIES) {
+      setMissingPreviews(prev => new Set(prev).add(id));
+      return;
+    }
+    setTimeout(() => {
+      setPreviewRetries(prev => ({ ...prev, [id]: (prev[id] ?? 0) + 1 }));
+    }, retryAfter * 1000);
+  };
+
   const fetchDocuments = async () => {
     try {
       const response = await fetch(`${API_BASE}/documents`);
@@ -312,9 +342,21 @@ function App() {
                 >
                   <div className="flex items-center justify-between">
                     <div className="flex items-center gap-4">
-                      <div className="bg-red-100 p-3 rounded-lg">
-                        <FileText className="h-6 w-6 text-red-600" />
-                      </div>
+                      {missingPreviews.has(doc.id) ? (
+                        <div className="bg-red-100 p-3 rounded-lg">
+                          <FileText className="h-6 w-6 text-red-600" />
+                        </div>
+                      ) : (
+                        <img
+                          src={`${API_BASE}/documents/${doc.id}/preview${
+                            previewRetries[doc.id] ? `?retry=${previewRetries[doc.id]}` : ''
+                          }`}
+                          alt=""
+                          loading="lazy"
+                          className="h-16 w-12 object-cover object-top rounded border bg-white"
+                          onError={() => handlePreviewError(doc.id)}
+                        />
+                      )}
                       <div>
                         <h3 className="font-semibold text-gray-900 text-lg">
                           {doc.filename}